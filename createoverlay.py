@@ -19,7 +19,7 @@ raw -> jpg, with the crop implemented as borders on all sides of the full raw di
 # verify python version early, before executing any logic that relies on features not available in all versions
 #
 import sys
-if (sys.version_info.major < 3) or (sys.version_info.minor < 10):
+if sys.version_info < (3, 10):
     print("Requires Python v3.10 or later but you're running v{}.{}.{}".format(sys.version_info.major, sys.version_info.minor, sys.version_info.micro))
     sys.exit(1)
 
@@ -28,12 +28,14 @@ if (sys.version_info.major < 3) or (sys.version_info.minor < 10):
 #
 import argparse
 import cameras
+from   concurrent.futures import ThreadPoolExecutor
 from   enum import Enum
+from   functools import lru_cache
 import importlib
+import importlib.util
 import math
 import os
 import platform
-import re
 import subprocess
 import sys
 import types
@@ -49,6 +51,7 @@ class VertPos(Enum): TOP=0; CENTER=1; BOTTOM=2
 class HorzPos(Enum): LEFT=0; CENTER=1; RIGHT=2
 Dimensions = NamedTuple('Dimensions', [('columns', int), ('rows', int)])
 RGB = NamedTuple('RGB', [('red', int), ('green', int), ('blue', int)])
+RawBorders = NamedTuple('RawBorders', [('left', int), ('top', int)])
 DashedLine = NamedTuple('DashedLine', [('dashLength', int), ('dashGap', int)])
 LabelPos = NamedTuple('LabelPos', [('vertPos', VertPos), ('horzPos', HorzPos)])
 Frameline = NamedTuple('Frameline', [('aspectRatio', Dimensions), ('lineWidth', int), ('dashedLine', DashedLine), ('lineColor', RGB), ('fillColor', RGB), ('labelPos', LabelPos)])
@@ -64,6 +67,10 @@ IfFileExistsStrs = [x.name for x in IfFileExists]
 VerbosityStrs = [x.name for x in Verbosity]
 VertPosStrs = [x.name for x in VertPos]
 HorzPosStrs = [x.name for x in HorzPos]
+VertPosStrSet = frozenset(VertPosStrs)
+HorzPosStrSet = frozenset(HorzPosStrs)
+HexDigitSet = frozenset("0123456789abcdefABCDEF")
+VerbosityLevel = Verbosity.DEBUG.value # print everything until setVerbosity() is called with the user's configured level
 
 
 #
@@ -71,57 +78,57 @@ HorzPosStrs = [x.name for x in HorzPos]
 # this allows us to display a user-friendly message for the missing modules instead of the
 # python-generated error message for missing imports
 #
-if __name__ == "__main__":
-    RequiredModule = NamedTuple('RequiredModule', [('importName', str), ('pipInstallName', str)])
-    def verifyRequiredModulesInstalled():
-        requiredModules = [
-            RequiredModule(importName="PIL", pipInstallName="pillow"),
-        ]
-        missingModules = list()
-        for requiredModule in requiredModules:
-            try:
-                importlib.import_module(requiredModule.importName)
-            except ImportError:
-                missingModules.append(requiredModule)
-        if missingModules:
-            print(f"Run the following commands to install required modules before using {AppName}:\n")
-            for requiredModule in missingModules:
-                print(f"\tpip install {requiredModule.pipInstallName}")
-            sys.exit(1)
+RequiredModule = NamedTuple('RequiredModule', [('importName', str), ('pipInstallName', str)])
+RequiredModules = [
+    RequiredModule(importName="PIL", pipInstallName="pillow"),
+    RequiredModule(importName="numpy", pipInstallName="numpy"),
+]
+Img2nefRequiredModules = [ # only needed when generating an NEF (--generatenef)
+    RequiredModule(importName="cv2", pipInstallName="opencv-python"),
+    RequiredModule(importName="numpy", pipInstallName="numpy"),
+]
+def verifyRequiredModulesInstalled(requiredModules: List[RequiredModule]):
+    # find_spec() only locates each module, without the cost of executing it like an import would
+    missingModules = [requiredModule for requiredModule in requiredModules if importlib.util.find_spec(requiredModule.importName) is None]
+    if missingModules:
+        print(f"Run the following commands to install required modules before using {AppName}:\n")
+        for requiredModule in missingModules:
+            print(f"\tpip install {requiredModule.pipInstallName}")
+        sys.exit(1)
 
-    verifyRequiredModulesInstalled()
+if __name__ == "__main__":
+    verifyRequiredModulesInstalled(RequiredModules)
 
 
 #
 # import optional modules now we've established they're available
 #
 from   PIL import Image, ImageDraw, ImageFont
+import numpy as np
 
 
 #
 # methods to handle conditional printing based on user-specified verbosity level
 #
+def setVerbosity(verbosity: Verbosity) -> None:
+    global VerbosityLevel
+    VerbosityLevel = verbosity.value
 def isVerbose() -> bool:
-    return Config.args.verbosity.value >= Verbosity.VERBOSE.value
+    return VerbosityLevel >= Verbosity.VERBOSE.value
+def isDebug() -> bool:
+    return VerbosityLevel >= Verbosity.DEBUG.value
 def printA(string: str): # print "always"
     print(string)
-def printIfVerbosityAllows(string: str, requiredVerbosityLevel: Verbosity) -> None:
-    if hasattr(Config, "args"):
-        if Config.args.verbosity.value >= requiredVerbosityLevel.value:
-            printA(string)
-    else:
-        # called before we've initialized Config.args
-        printA(string)
 def printE(string: str): # print error
     printA(f"ERROR: {string}")
 def printW(string: str): # print warnings, if verbosity config allows
-    printIfVerbosityAllows(f"WARNING: {string}", Verbosity.WARNING)
+    if VerbosityLevel >= Verbosity.WARNING.value: printA(f"WARNING: {string}")
 def printI(string: str): # print "informational" messages, if verbosity config allows
-    printIfVerbosityAllows(f"INFO: {string}", Verbosity.INFO)
+    if VerbosityLevel >= Verbosity.INFO.value: printA(f"INFO: {string}")
 def printV(string: str): # print "verbose" messages, if verbosity config allows
-    printIfVerbosityAllows(f"VERBOSE: {string}", Verbosity.VERBOSE)
+    if VerbosityLevel >= Verbosity.VERBOSE.value: printA(f"VERBOSE: {string}")
 def printD(string: str): # print "debug" messages, if verbosity config allows
-    printIfVerbosityAllows(f"DEBUG: {string}", Verbosity.DEBUG)
+    if VerbosityLevel >= Verbosity.DEBUG.value: printA(f"DEBUG: {string}")
 
 
 def getScriptDir() -> str:
@@ -143,12 +150,16 @@ def openFileInOS(filename: str) -> bool:
     :param filename: Filename to open
     :return: False if successful, TRUE if error
     """
-    printV(f"Opening \"{os.path.realpath(filename)}\" in default system image viewer")
+    if isVerbose(): # check before calling printV() to avoid the realpath() lookup when it won't be printed
+        printV(f"Opening \"{os.path.realpath(filename)}\" in default system image viewer")
     try:
         if platform.system() == "Windows":
-            os.startfile(filename)
-        else: # both Linux and Darwin (aka Mac) use "open"
-            subprocess.call(['open', filename])
+            os.startfile(filename) # already returns without waiting for the viewer
+        else:
+            # Darwin (aka Mac) uses "open", Linux uses "xdg-open". launch without waiting on it, since some
+            # desktop environments don't return until the viewer exits
+            opener = 'open' if platform.system() == "Darwin" else 'xdg-open'
+            subprocess.Popen([opener, filename], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
     except Exception as e:
         printW(f"Unable to open file \"{filename}\" in your OS's file viewer, error: {e}")
         return True
@@ -204,7 +215,8 @@ def processCmdLine() -> argparse.Namespace:
         fConversionError, strList = parseDelimitedString(string, delimiter, numValues, descForError)
         if fConversionError or (not strList):
             return fConversionError, strList
-        if not all(s.isdigit() for s in strList):
+        # isdigit() alone accepts non-ASCII digits, which int() would then convert
+        if not all(s.isascii() and s.isdigit() for s in strList):
             printE(f"{descForError} and values must be valid integer digits [0-9] but \"{string}\" was specified instead.")
             return True, None
         valueList = [int(s) for s in strList]
@@ -213,11 +225,11 @@ def processCmdLine() -> argparse.Namespace:
     def convertRgbStr(rgbHexStr: str) -> tuple[bool, RGB]:
         if (not rgbHexStr) or (rgbHexStr == 'none'):
             return False, None
-        m = re.search(r"#([0-9a-f][0-9a-f])([0-9a-f][0-9a-f])([0-9a-f][0-9a-f])", rgbHexStr)
-        if not m:
+        # the digits are checked up front since int(x, 16) also accepts signs, underscores, and whitespace
+        if (len(rgbHexStr) != 7) or (rgbHexStr[0] != '#') or not all(c in HexDigitSet for c in rgbHexStr[1:]):
             printE(f"RGB must be in the form of #RRGGBB, where RGB are hex digits. \"{rgbHexStr}\" was specified instead.")
             return True, None
-        return False, RGB(int(m.group(1), 16), int(m.group(2), 16), int(m.group(3), 16))
+        return False, RGB(int(rgbHexStr[1:3], 16), int(rgbHexStr[3:5], 16), int(rgbHexStr[5:7], 16))
 
     def convertRatioStr(string: str, ratioDesc: str) -> tuple[bool, Dimensions]:
         fConversionError, valueList = convertDelimitedIntValueString(string=string, delimiter=":", numValues=2, descForError=f"{ratioDesc} must be in the form of width:height")
@@ -260,21 +272,34 @@ def processCmdLine() -> argparse.Namespace:
         if fConversionError or (not strList):
             return fConversionError, strList
         vertPosStr, horzPosStr = strList
-        if vertPosStr not in VertPosStrs:
+        if vertPosStr not in VertPosStrSet:
             printE(f"Invalid vertical position: Valid values are: {VertPosStrs}")
             return True, None
-        if horzPosStr not in HorzPosStrs:
+        if horzPosStr not in HorzPosStrSet:
             printE(f"Invalid horizontal position: Valid values are: {HorzPosStrs}")
             return True, None
         labelPos = LabelPos(vertPos=VertPos[vertPosStr], horzPos=HorzPos[horzPosStr])
         return False, labelPos
 
+    # conversion method for each --frameline/--gridline attribute
+    attributeConverters = {
+        "aspectratio"    : lambda string: convertRatioStr(string, "Aspect ratio"),
+        "griddimensions" : lambda string: convertDimensionsStr(string, "Grid dimensions"),
+        "linewidth"      : convertLineWidthStr,
+        "dashedline"     : convertDashedLineStr,
+        "linecolor"      : convertColorStr,
+        "fillcolor"      : convertColorStr,
+        "labelpos"       : convertLabelPosStr,
+    }
+
     def parseAttributeValuePairs(attributeValueStr: str, attributeOrderForUnamedFields: List, optionDescStr: str):
 
         # initialize dict with None for all values, to handle the case of values not specified in 'attributeValueStr'
         attributeValueDict = dict()
         for attributeStr in attributeOrderForUnamedFields:
             attributeValueDict[attributeStr] = None
+        # maps each attribute name to its position in 'attributeOrderForUnamedFields', also used to validate attribute names
+        attributeOrderIndexDict = {attributeStr: index for index, attributeStr in enumerate(attributeOrderForUnamedFields)}
 
         attributeValueListStr = attributeValueStr.split(',')
         indexForUnamedField = 0
@@ -288,29 +313,15 @@ def processCmdLine() -> argparse.Namespace:
                 attributeStr = attributeOrderForUnamedFields[indexForUnamedField]
                 valueStr = attributeAndValueStr
             attributeStr = attributeStr.lower()
-            if attributeStr not in attributeOrderForUnamedFields:
+            if attributeStr not in attributeOrderIndexDict:
                 printE(f"Uknown or unexpected attribute \"{attributeStr}\" for \"{optionDescStr}\" \"{attributeValueStr}\"")
                 return None
-            match attributeStr:
-                case "aspectratio":
-                    fConversionError, value = convertRatioStr(valueStr, "Aspect ratio")
-                case "griddimensions":
-                    fConversionError, value = convertDimensionsStr(valueStr, "Grid dimensions")
-                case "linewidth":
-                    fConversionError, value = convertLineWidthStr(valueStr)
-                case "dashedline":
-                    fConversionError, value = convertDashedLineStr(valueStr)
-                case "linecolor":
-                    fConversionError, value = convertColorStr(valueStr)
-                case "fillcolor":
-                    fConversionError, value = convertColorStr(valueStr)
-                case "labelpos":
-                    fConversionError, value = convertLabelPosStr(valueStr)
+            fConversionError, value = attributeConverters[attributeStr](valueStr)
             if fConversionError:
                 return None
             attributeValueDict[attributeStr] = value
             # if user specified attribute by name, then next (possibly unamed) attribute we expect after is the one after the attribute user specified (orderi in attributeOrderForUnamedFields)
-            indexForUnamedField = attributeOrderForUnamedFields.index(attributeStr)+1
+            indexForUnamedField = attributeOrderIndexDict[attributeStr]+1
         return attributeValueDict
 
     # arg parser that throws exceptions on errors
@@ -487,6 +498,7 @@ def processCmdLine() -> argparse.Namespace:
     # convert from strs to enumerated values
     args.ifexists = IfFileExists[args.ifexists]
     args.verbosity = Verbosity[args.verbosity]
+    setVerbosity(args.verbosity)
 
     return args
 
@@ -501,17 +513,12 @@ def runImg2nef(overlayFilename: str):
     """
 
     outputFilename = generateFilenameWithDifferentExtensionAndDir(overlayFilename, Config.args.outputdir, "NEF")
-    try:
-        import img2nef
-    except Exception as e:
-        printE(f"Unable to import the img2nef.py module needed to generate an NEF: {e}")
-        return True
     argvSaved = sys.argv
     sys.argv = ['img2nef.py', Config.args.camera, overlayFilename, f'{outputFilename}', '--src.hsl=1.0,1.0,1.0', f'--verbosity={Config.args.verbosity.name}']
     if Config.args.outputdir:
         # even though 'outputFilename' includes a possible outputdir, specify again in case there's a different default included in a .options file for img2nef
         sys.argv.append(f'--outputdir={Config.args.outputdir}')
-    printV(f"Calling img2nef to generate NEF, args: {sys.argv}")
+    if isVerbose(): printV(f"Calling img2nef to generate NEF, args: {sys.argv}")
     fimg2nefError = img2nef.run()
     if fimg2nefError:
         printE(f"Attempt to generate NEF with 'img2nef' failed")
@@ -564,15 +571,30 @@ def generateUniqueFilenameFromExistingIfNecessary(fullPath: str) -> str:
     fullPath with a unique suffix
     """
 
+    if not os.path.exists(fullPath):
+        return fullPath # first candidate is without a suffix
+
+    #
+    # list the directory once rather than checking each suffixed candidate for existence, since
+    # a directory accumulating outputs would otherwise take a check per previously-used suffix.
+    # names are compared case-insensitively so a case-insensitive filesystem can't produce a false
+    # "doesn't exist", and the chosen candidate is still checked in case it was created meanwhile
+    #
     dir, root, ext = splitPathIntoParts(fullPath)
+    try:
+        with os.scandir(dir or os.curdir) as dirEntries:
+            existingFilenames = {dirEntry.name.casefold() for dirEntry in dirEntries}
+    except OSError:
+        existingFilenames = set()
 
-    seqNum = 0; seqNumStr = "" # first candidate is without a suffix
+    seqNum = 1
     while True:
-        filenameCandidate = os.path.join(dir, root + seqNumStr + ext)
-        if not os.path.exists(filenameCandidate):
-            return filenameCandidate
+        candidateFilename = f"{root}-{seqNum}{ext}"
+        if candidateFilename.casefold() not in existingFilenames:
+            filenameCandidate = os.path.join(dir, candidateFilename)
+            if not os.path.exists(filenameCandidate):
+                return filenameCandidate
         seqNum += 1
-        seqNumStr = f"-{seqNum}"
 
 
 def generateOutputFilename() -> str:
@@ -581,21 +603,20 @@ def generateOutputFilename() -> str:
     Generates the filename to hold encoded output, based on user settings
 
     :return: Output filename. sys.exit() is called for the case where we can't overwrite an existing file
+    (saveOutputImage() repeats the check atomically when it creates the file)
     """
 
     outputFilename = Config.args.outputfilename
     if outputFilename is None:
         # user didn't specify an output filename - generate one ourselves
-        outputFilename = "Overlay_"
+        filenameParts = ["Overlay_"]
         if Config.args.camera:
-            outputFilename += f"{Config.args.camera}"
+            filenameParts.append(f"{Config.args.camera}")
         else:
-            outputFilename += f"{Config.args.jpgDimensions.columns}x{Config.args.jpgDimensions.rows}"
-        for index, frameline in enumerate(Config.args.framelines):
-            outputFilename += f"_Frame-{frameline.aspectRatio.columns}x{frameline.aspectRatio.rows}"
-        for index, gridline in enumerate(Config.args.gridlines):
-            outputFilename += f"_Grid-{gridline.gridDimensions.columns}x{gridline.gridDimensions.rows}"
-        outputFilename = generateFilenameWithDifferentExtensionAndDir(outputFilename, Config.args.outputdir, Config.args.imageTypeExtension)
+            filenameParts.append(f"{Config.args.jpgDimensions.columns}x{Config.args.jpgDimensions.rows}")
+        filenameParts += [f"_Frame-{frameline.aspectRatio.columns}x{frameline.aspectRatio.rows}" for frameline in Config.args.framelines]
+        filenameParts += [f"_Grid-{gridline.gridDimensions.columns}x{gridline.gridDimensions.rows}" for gridline in Config.args.gridlines]
+        outputFilename = generateFilenameWithDifferentExtensionAndDir("".join(filenameParts), Config.args.outputdir, Config.args.imageTypeExtension)
     else:
         # user specified output filename. if it didn't specify an extension, add it
         root, ext = os.path.splitext(outputFilename)
@@ -617,6 +638,162 @@ def generateOutputFilename() -> str:
     return outputFilename
 
 
+def saveOutputImage(img: Image, outputFilename: str) -> tuple[bool, str]:
+
+    """
+    Saves the generated image. Unless we're overwriting, the file is created exclusively (O_EXCL), so
+    that an existing file is never clobbered, even one created by another process after we
+    generated the filename
+
+    :param img: Image to save
+    :param outputFilename: Filename from generateOutputFilename()
+    :return: Tuple of (True if error, filename the image was saved to)
+    """
+
+    originalFilename = outputFilename
+    fd = None
+    try:
+        # resolve the format from the extension up front, since we're saving to a file object rather than a filename
+        ext = os.path.splitext(outputFilename)[1].lower()
+        imageFormat = Image.registered_extensions().get(ext)
+        if imageFormat is None:
+            raise ValueError(f"unknown file extension: {ext}")
+        # overlays are mostly large runs of identical pixels, which even zlib's fastest level compresses
+        # well. it's noticeably faster than PIL's default level on raw-sized images
+        saveOptions = {'compress_level': 1} if imageFormat == 'PNG' else {}
+        if Config.args.ifexists == IfFileExists.OVERWRITE:
+            img.save(outputFilename, format=imageFormat, **saveOptions)
+            return False, outputFilename
+        while fd is None:
+            try:
+                fd = os.open(outputFilename, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+            except FileExistsError:
+                if Config.args.ifexists == IfFileExists.EXIT:
+                    printE(f"Output file \"{outputFilename}\" already exists. Exiting per --ifexists setting")
+                    return True, outputFilename
+                # another file with our name appeared since the filename was generated - pick the next available suffix
+                outputFilename = generateUniqueFilenameFromExistingIfNecessary(originalFilename)
+        with os.fdopen(fd, 'wb') as file:
+            img.save(file, format=imageFormat, **saveOptions)
+    except Exception as e:
+        printE(f"Unable to save output to \"{outputFilename}, error: {e}")
+        if fd is not None:
+            # don't leave behind the partial file we created
+            try:
+                os.remove(outputFilename)
+            except OSError:
+                pass
+        return True, outputFilename
+    return False, outputFilename
+
+
+class Canvas:
+
+    """
+    RGB drawing surface backed by a numpy array. Lines and fills are axis-aligned rectangles, which
+    become single vectorized slice assignments instead of individual PIL draw calls. The array is
+    converted to a PIL image only for text rendering (of just the label's region) and for saving.
+
+    Rectangle fills are queued and then executed by a pool of threads, each handling its own horizontal
+    band of the canvas. Every thread applies the full queue in order, clipped to its band, so overlapping
+    shapes composite exactly as if drawn sequentially. numpy releases the GIL for the slice assignments,
+    which lets the bands fill concurrently
+    """
+
+    MinRowsPerBand = 256 # don't split the canvas into bands smaller than this, where thread overhead would dominate
+
+    def __init__(self, dimensions: Dimensions, backgroundColor: RGB):
+        shape = (dimensions.rows, dimensions.columns, 3)
+        if (not backgroundColor) or (backgroundColor == (0, 0, 0)):
+            # np.zeros() gets pre-zeroed pages from the OS, avoiding a write of every pixel for the default black background
+            self.array = np.zeros(shape, dtype=np.uint8)
+        else:
+            self.array = np.full(shape, backgroundColor, dtype=np.uint8)
+        self.pendingFills = list()
+
+    def fillRect(self, x1: int, y1: int, x2: int, y2: int, color: RGB):
+
+        """
+        Fills a rectangle, clipped to the canvas
+
+        :param x1: x-coordinate of the top-left corner
+        :param y1: y-coordinate of the top-left corner
+        :param x2: x-coordinate of the bottom-right corner (inclusive)
+        :param y2: y-coordinate of the bottom-right corner (inclusive)
+        :param color: Fill color
+        """
+
+        # clip the starting coordinates so negative values don't wrap the slice around the array. ending coordinates are clipped by numpy
+        x1 = max(int(x1), 0); y1 = max(int(y1), 0)
+        x2 = int(x2); y2 = int(y2)
+        if (x2 >= x1) and (y2 >= y1):
+            self.pendingFills.append((x1, y1, x2+1, y2+1, np.array(color, dtype=np.uint8)))
+
+    def flush(self):
+
+        """
+        Executes all queued rectangle fills, splitting the canvas into horizontal bands filled in parallel
+        """
+
+        if not self.pendingFills:
+            return
+        pendingFills = self.pendingFills
+        self.pendingFills = list()
+
+        def fillBand(bandY1: int, bandY2: int):
+            for x1, y1, x2, y2, color in pendingFills:
+                y1 = max(y1, bandY1); y2 = min(y2, bandY2)
+                if y2 > y1:
+                    self.array[y1:y2, x1:x2] = color
+
+        rows = self.array.shape[0]
+        numBands = max(min(os.cpu_count() or 1, rows // Canvas.MinRowsPerBand), 1)
+        if numBands == 1:
+            fillBand(0, rows)
+            return
+        rowsPerBand = -(-rows // numBands) # ceiling division
+        with ThreadPoolExecutor(max_workers=numBands) as executor:
+            # list() to wait for completion and propagate any exceptions
+            list(executor.map(fillBand, range(0, rows, rowsPerBand), range(rowsPerBand, rows+rowsPerBand, rowsPerBand)))
+
+    def drawText(self, x: float, y: float, text: str, color: RGB, font: Any):
+
+        """
+        Draws text with its top-left at the specified coordinates. Only the region covered by the text
+        is round-tripped through PIL, to avoid converting the entire canvas
+
+        :param x: x-coordinate of text's top-left
+        :param y: y-coordinate of text's top-left
+        :param text: Text to draw
+        :param color: Color of text
+        :param font: Font to render text with
+        """
+
+        self.flush() # text is blended with what's beneath it, so all prior fills must be drawn first
+        left, top, right, bottom = font.getbbox(text, anchor="lt")
+        rows, columns, _ = self.array.shape
+        regionX1 = max(math.floor(x + left) - 1, 0); regionY1 = max(math.floor(y + top) - 1, 0)
+        regionX2 = min(math.ceil(x + right) + 1, columns); regionY2 = min(math.ceil(y + bottom) + 1, rows)
+        if (regionX2 <= regionX1) or (regionY2 <= regionY1):
+            return
+        regionImg = Image.fromarray(self.array[regionY1:regionY2, regionX1:regionX2])
+        # translate by whole pixels only so PIL renders any fractional position the same as on the full image
+        ImageDraw.Draw(regionImg).text((x - regionX1, y - regionY1), text, fill=color, font=font, anchor="lt")
+        self.array[regionY1:regionY2, regionX1:regionX2] = np.asarray(regionImg)
+
+    def toImage(self) -> Image:
+
+        """
+        Converts the canvas to a PIL image
+
+        :return: PIL image
+        """
+
+        self.flush()
+        return Image.fromarray(self.array)
+
+
+@lru_cache(maxsize=64)
 def calcAspectRatioDimensions(imageDimensions: Dimensions, desiredAspectRatioDimensions: Dimensions) -> Dimensions:
 
     """
@@ -627,19 +804,16 @@ def calcAspectRatioDimensions(imageDimensions: Dimensions, desiredAspectRatioDim
     :return: Dimensions of box that fit within the specified image dimensions and have the specified aspect ratio
     """
 
-    imageAspectRatio = imageDimensions.columns / imageDimensions.rows
-    desiredAspectRatio = desiredAspectRatioDimensions.columns / desiredAspectRatioDimensions.rows
-
-    multiplier = imageAspectRatio / desiredAspectRatio
-
-    if multiplier <= 1.0:
+    # note: results are cached since every frameline/gridline calculates against the same image dimensions.
+    # ratios are compared by cross-multiplication so the result is exact integer math, without float rounding
+    if imageDimensions.columns * desiredAspectRatioDimensions.rows <= imageDimensions.rows * desiredAspectRatioDimensions.columns:
         # we will lose rows in image, ie use all image columns and calculate how many rows can fit
         columns = imageDimensions.columns
-        rows = int(columns * (1/desiredAspectRatio))
+        rows = columns * desiredAspectRatioDimensions.rows // desiredAspectRatioDimensions.columns
     else:
         # we will lose columns in image, ie use all image rows and calculate how many columns can fit
         rows = imageDimensions.rows
-        columns = int(rows * desiredAspectRatio)
+        columns = rows * desiredAspectRatioDimensions.columns // desiredAspectRatioDimensions.rows
     return Dimensions(columns, rows)
 
 
@@ -648,7 +822,7 @@ def calcLineWidthExpansion(coordinate: int, lineWidth: int, lineWidthExpansion:
     """
     Calculates how to draw the width of a line based on a specified expansion type. PIL's internal width implementation
     is always centered and doesn't handle fractional/remainders consistently, so we implement width ourselves by drawing
-    multiple lines. This method determines how the pixels are distributed relative to the starting coordinate of the line
+    a filled rectangle spanning the width. This method determines how the pixels are distributed relative to the starting coordinate of the line
 
     :param coordinate: Starting coordinate to draw (either x or y coordinate, whichever is the variant)
     :param lineWidth: Width of line
@@ -670,132 +844,131 @@ def calcLineWidthExpansion(coordinate: int, lineWidth: int, lineWidthExpansion:
             end = coordinate+lineWidth
         case LineWidthExpansion.EXPAND_LEFT_UP:
             # y coordinate is an ending coordinate, so draw width by expanding up
-            start = (coordinate-lineWidth)+1 # note: ending coordinate is inclusive, so +1 to handle properly in for() loop below
+            start = (coordinate-lineWidth)+1 # note: ending coordinate is inclusive, so +1 to handle properly in the callers
             end = coordinate+1
     return (start, end)
 
 
-def drawSolidHorzLine(draw: ImageDraw, x1: int, x2: int, y: int, lineWidth: int, lineWidthExpansion: LineWidthExpansion, lineColor: RGB):
+def drawSolidHorzLineSegments(canvas: Canvas, segments: List[Tuple[int, int]], sy: int, ey: int, lineColor: RGB):
 
     """
-    Draws a solid horizontal line
+    Draws one or more solid horizontal line segments that share the same y-coordinate
 
-    :param draw: Canvas to draw on
-    :param x1: Starting x-coordiante
-    :param x2: Ending x-coordinate (inclusive)
-    :param y: y-coordinate
-    :param lineWidth: Line width
-    :param lineWidthExpansion: See calcLineWidthExpansion() documentation
+    :param canvas: Canvas to draw on
+    :param segments: List of (starting x-coordinate, ending x-coordinate (inclusive)) for each segment
+    :param sy: Starting y-coordinate of the line's width, from calcLineWidthExpansion()
+    :param ey: Ending y-coordinate of the line's width (exclusive), from calcLineWidthExpansion()
+    :param lineColor: Color of line
     """
 
-    sy, ey = calcLineWidthExpansion(y, lineWidth, lineWidthExpansion)
-    for wy in range(sy, ey):
-        draw.line([(x1, wy), (x2, wy)], width=1, fill=lineColor)
+    # each segment's width is an axis-aligned rectangle, so fill it in a single call instead of one line per row
+    for x1, x2 in segments:
+        canvas.fillRect(x1, sy, x2, ey-1, lineColor)
 
 
-def drawSolidVertLine(draw: ImageDraw, y1: int, y2: int, x: int, lineWidth: int, lineWidthExpansion: LineWidthExpansion, lineColor: RGB):
+def drawSolidVertLineSegments(canvas: Canvas, segments: List[Tuple[int, int]], sx: int, ex: int, lineColor: RGB):
 
     """
-    Draws a solid vertical line
+    Draws one or more solid vertical line segments that share the same x-coordinate
 
-    :param draw: Canvas to draw on
-    :param y1: Starting y-coordiante
-    :param y2: Ending y-coordinate (inclusive)
-    :param x: x-coordinate
-    :param lineWidth: Line width
-    :param lineWidthExpansion: See calcLineWidthExpansion() documentation
+    :param canvas: Canvas to draw on
+    :param segments: List of (starting y-coordinate, ending y-coordinate (inclusive)) for each segment
+    :param sx: Starting x-coordinate of the line's width, from calcLineWidthExpansion()
+    :param ex: Ending x-coordinate of the line's width (exclusive), from calcLineWidthExpansion()
     :param lineColor: Color of line
     """
 
-    sx, ex = calcLineWidthExpansion(x, lineWidth, lineWidthExpansion)
-    for wx in range(sx, ex):
-        draw.line([(wx, y1), (wx, y2)], width=1, fill=lineColor)
+    # each segment's width is an axis-aligned rectangle, so fill it in a single call instead of one line per column
+    for y1, y2 in segments:
+        canvas.fillRect(sx, y1, ex-1, y2, lineColor)
 
 
-def calcDashedLineLastSegmentDrawLength(dashedLine: DashedLine, lineStart: int, lineEnd: int, lastDrawnCoordinate: int) -> int:
+def calcDashedLineSegments(lineStart: int, lineEnd: int, dashedLine: DashedLine, fCompleteDashedLineEdge: bool) -> List[Tuple[int, int]]:
 
     """
-    Calculates the length of the last segment of a dashed line. This is done to prevent a long gap in the corners of shape
-    drawn with dashed lines.
+    Calculates the segments that make up a line, including support for dashed lines
 
-    :param dashedLine: Dashed line specification
     :param lineStart: Starting line coordinate (x-coordinate for horizontal lines, y-coordinate for vertical lines)
-    :param lineEnd: Ending line coordinate (x-coordinate for horizontal lines, y-coordinate for vertical lines)
-    :param lastDrawnCoordinate: The ending coordinate of the last dashed line segment drawn
-    :return: Length of an additional segment to draw, or zero if no additional segment is necessary
+    :param lineEnd: Ending line coordinate (inclusive)
+    :param dashedLine: Dashed line specification, or None for a solid line
+    :param fCompleteDashedLineEdge: Add a segment at the end of the line if the last dash leaves too large a gap
+    :return: List of (starting coordinate, ending coordinate (inclusive)) for each segment
     """
 
-    totalLineLen = (lineEnd - lineStart)+1
-    maxEdgeGap = int(totalLineLen * .02) # debug: was .10
-    edgeGap = (lineEnd - lastDrawnCoordinate)+1
-    printD(f"Calc Dashed Last Segment: {totalLineLen=}, {maxEdgeGap=}, {edgeGap=}, return: {min(maxEdgeGap, dashedLine.dashLength) if edgeGap >= maxEdgeGap else 0}")
-    if edgeGap < maxEdgeGap:
-        return 0
-    return min(maxEdgeGap, dashedLine.dashLength)
+    if not dashedLine:
+        # solid line
+        dashedLine = DashedLine(dashLength=sys.maxsize, dashGap=0)
+        segments = [(lineStart, lineEnd)] if lineEnd > lineStart else []
+    else:
+        segmentStarts = np.arange(lineStart, lineEnd, dashedLine.dashLength + dashedLine.dashGap)
+        segmentEnds = np.minimum(segmentStarts + (dashedLine.dashLength - 1), lineEnd)
+        segments = list(zip(segmentStarts.tolist(), segmentEnds.tolist()))
+    if fCompleteDashedLineEdge and segments:
+        # if the last segment drawn leaves a gap at the end of the line larger than 2% of the line's length then
+        # add another segment to fill it. this prevents a long gap in the corners of shapes drawn with dashed lines
+        maxEdgeGap = int(((lineEnd - lineStart)+1) * .02)
+        edgeGap = (lineEnd - segments[-1][1])+1
+        lastSegmentDrawLength = min(maxEdgeGap, dashedLine.dashLength) * (edgeGap >= maxEdgeGap)
+        if isDebug(): printD(f"Calc Dashed Last Segment: totalLineLen={(lineEnd - lineStart)+1}, {maxEdgeGap=}, {edgeGap=}, return: {lastSegmentDrawLength}")
+        if lastSegmentDrawLength > 0:
+            segments.append((lineEnd-lastSegmentDrawLength, lineEnd))
+    return segments
 
 
-def drawHorzLine(draw: ImageDraw, x1: int, x2: int, y: int, lineWidth: int, lineWidthExpansion: LineWidthExpansion, dashedLine: DashedLine, lineColor: RGB, fCompleteDashedLineEdge: bool):
+def drawHorzLine(canvas: Canvas, x1: int, x2: int, y: int, lineWidth: int, lineWidthExpansion: LineWidthExpansion, dashedLine: DashedLine, lineColor: RGB, fCompleteDashedLineEdge: bool):
 
     """
     Draws a horizontal line, including support for dashed lines
 
-    :param draw: Canvas to draw on
+    :param canvas: Canvas to draw on
     :param x1: Starting x-coordiante
     :param x2: Ending x-coordinate (inclusive)
     :param y: y-coordinate
     :param lineWidth: Line width
-    :param lineWidthExpansion: See drawSolidHorzLine() documentation
+    :param lineWidthExpansion: See calcLineWidthExpansion() documentation
     :param dashedLine: Dashed line specification, or None for a solid line
     :param lineColor: Color of line
     :param fCompleteDashedLineEdge:
     """
 
-    if not dashedLine:
-        # solid line
-        dashedLine = DashedLine(dashLength=sys.maxsize, dashGap=0)
-    for x in range(x1, x2, dashedLine.dashLength + dashedLine.dashGap):
-        endx = min(x + dashedLine.dashLength - 1, x2)
-        drawSolidHorzLine(draw, x, endx, y, lineWidth, lineWidthExpansion, lineColor)
-    if fCompleteDashedLineEdge:
-        lastSegmentDrawLength = calcDashedLineLastSegmentDrawLength(dashedLine=dashedLine, lineStart=x1, lineEnd=x2, lastDrawnCoordinate=endx)
-        if lastSegmentDrawLength > 0:
-            drawSolidHorzLine(draw, x2-lastSegmentDrawLength, x2, y, lineWidth, lineWidthExpansion, lineColor)
+    # the line width is the same for every segment, so calculate it once per line
+    sy, ey = calcLineWidthExpansion(y, lineWidth, lineWidthExpansion)
+    if ey <= sy:
+        return
+    segments = calcDashedLineSegments(x1, x2, dashedLine, fCompleteDashedLineEdge)
+    drawSolidHorzLineSegments(canvas, segments, sy, ey, lineColor)
 
 
-def drawVertLine(draw: ImageDraw, y1: int, y2: int, x: int, lineWidth: int, lineWidthExpansion: LineWidthExpansion, dashedLine: DashedLine, lineColor: RGB, fCompleteDashedLineEdge: bool):
+def drawVertLine(canvas: Canvas, y1: int, y2: int, x: int, lineWidth: int, lineWidthExpansion: LineWidthExpansion, dashedLine: DashedLine, lineColor: RGB, fCompleteDashedLineEdge: bool):
 
     """
     Draws a vertical line, including support for dashed lines
 
-    :param draw: Canvas to draw on
+    :param canvas: Canvas to draw on
     :param y1: Starting y-coordiante
     :param y2: Ending y-coordinate (inclusive)
     :param x: y-coordinate
     :param lineWidth: Line width
-    :param lineWidthExpansion: See drawSolidHorzLine() documentation
+    :param lineWidthExpansion: See calcLineWidthExpansion() documentation
     :param dashedLine: Dashed line specification, or None for a solid line
     :param lineColor: Color of line
     :param fCompleteDashedLineEdge:
     """
 
-    if not dashedLine:
-        # solid line
-        dashedLine = DashedLine(dashLength=sys.maxsize, dashGap=0)
-    for y in range(y1, y2, dashedLine.dashLength + dashedLine.dashGap):
-        endy = min(y + dashedLine.dashLength - 1, y2)
-        drawSolidVertLine(draw, y, endy, x, lineWidth, lineWidthExpansion, lineColor)
-    if fCompleteDashedLineEdge:
-        lastSegmentDrawLength = calcDashedLineLastSegmentDrawLength(dashedLine=dashedLine, lineStart=y1, lineEnd=y2, lastDrawnCoordinate=endy)
-        if lastSegmentDrawLength > 0:
-            drawSolidVertLine(draw, y2-lastSegmentDrawLength, y2, x, lineWidth, lineWidthExpansion, lineColor)
+    # the line width is the same for every segment, so calculate it once per line
+    sx, ex = calcLineWidthExpansion(x, lineWidth, lineWidthExpansion)
+    if ex <= sx:
+        return
+    segments = calcDashedLineSegments(y1, y2, dashedLine, fCompleteDashedLineEdge)
+    drawSolidVertLineSegments(canvas, segments, sx, ex, lineColor)
 
 
-def drawRectangle(draw: ImageDraw, x1: int, y1: int, x2: int, y2: int, lineWidth: int, dashedLine: DashedLine, lineColor: RGB, fillColor: RGB, fCompleteCorners=True):
+def drawRectangle(canvas: Canvas, x1: int, y1: int, x2: int, y2: int, lineWidth: int, dashedLine: DashedLine, lineColor: RGB, fillColor: RGB, fCompleteCorners=True):
 
     """
     Draws a rectangle, including support for dashed lines
 
-    :param draw: Canvas to draw on
+    :param canvas: Canvas to draw on
     :param x1: x-coordinate of the top-left corner
     :param y1: y-coordinate of the top-left corner
     :param x2: x-coordinate of the bottom-right corner (inclusive)
@@ -808,120 +981,188 @@ def drawRectangle(draw: ImageDraw, x1: int, y1: int, x2: int, y2: int, lineWidth
     """
 
     if fillColor: # fill the rect if specified
-        draw.rectangle([(x1+lineWidth, y1+lineWidth), (x2-lineWidth, y2-lineWidth)], outline=fillColor, fill=fillColor)
+        canvas.fillRect(x1+lineWidth, y1+lineWidth, x2-lineWidth, y2-lineWidth, fillColor)
 
     if lineWidth > 0: # draw the rect if specified
         # draw top and bottom horizontal lines of rect
-        drawHorzLine(draw, x1, x2, y1, lineWidth, LineWidthExpansion.EXPAND_RIGHT_DOWN, dashedLine, lineColor, fCompleteCorners)
-        drawHorzLine(draw, x1, x2, y2, lineWidth, LineWidthExpansion.EXPAND_LEFT_UP, dashedLine, lineColor, fCompleteCorners)
+        drawHorzLine(canvas, x1, x2, y1, lineWidth, LineWidthExpansion.EXPAND_RIGHT_DOWN, dashedLine, lineColor, fCompleteCorners)
+        drawHorzLine(canvas, x1, x2, y2, lineWidth, LineWidthExpansion.EXPAND_LEFT_UP, dashedLine, lineColor, fCompleteCorners)
         # draw left and right vertical lines of rect
-        drawVertLine(draw, y1, y2, x1, lineWidth, LineWidthExpansion.EXPAND_RIGHT_DOWN, dashedLine, lineColor, fCompleteCorners)
-        drawVertLine(draw, y1, y2, x2, lineWidth, LineWidthExpansion.EXPAND_LEFT_UP, dashedLine, lineColor, fCompleteCorners)
+        drawVertLine(canvas, y1, y2, x1, lineWidth, LineWidthExpansion.EXPAND_RIGHT_DOWN, dashedLine, lineColor, fCompleteCorners)
+        drawVertLine(canvas, y1, y2, x2, lineWidth, LineWidthExpansion.EXPAND_LEFT_UP, dashedLine, lineColor, fCompleteCorners)
 
 
-def drawFrameline(draw: ImageDraw, rawDimensions: Dimensions, jpgDimensions: Dimensions, aspectRatioDimensions: Dimensions, lineWidth: int, dashedLine: DashedLine, lineColor: RGB, fillColor: RGB, labelPos: LabelPos) -> None:
+@lru_cache(maxsize=None)
+def loadDefaultFont(fontSize: int) -> Any:
 
     """
-    Draws framelines with the specified aspect ratio that fits within the specified jpg dimensions
+    Loads PIL's default font at the specified size. Cached since each load_default() call decodes
+    and parses the embedded font data again
 
-    :param draw: Canvas to draw on
-    :param rawDimensions: Camera's raw image dimensions
-    :param jpgDimensions: Camera's jpg image dimensions
-    :param aspectRatioDimensions: Aspect ratio of box
-    :param lineWidth: Width of lines
-    :param dashedLine: Optional dash/dashed-line specification. If not provided then solid
-    :param lineColor: Color of lines
-    :param fillColor: Color to fill area with
-    :param labelPos: Position of text label for aspect ratio, or None for no label
-    lines will be  used.
+    :param fontSize: Font size
+    :return: Default font at the specified size
     """
 
-    def getFontBySizeForPixelHeight(string: str, maxiumHeightWantedInPixels: int) -> Any:
+    return ImageFont.load_default(size=fontSize)
 
-        """
-        Returns a font whose size is as close to "maxiumHeightWantedInPixels" as possible without
-        going over when rendering the supplied string
-        :param string: Text to calucate font size from
-        :param maxiumHeightWantedInPixels: Maximum height of font desired, in pixels
-        :return: Default font whose size meets criteria
-        """
 
-        fontSize = 16384 # abusrdly high value to handle largest fontSizePct possible (100%)
-        while fontSize >= 8:
-            prevFontSize = fontSize
-            defaultFont = ImageFont.load_default(size=fontSize)
-            left, top, right, bottom = draw.textbbox((0,0), string, font=defaultFont)
-            textHeightPixels = int(bottom-top)
-            textWidthPixels = int(right-left)
-            if textHeightPixels <= maxiumHeightWantedInPixels:
-                break
-            multiple  = textHeightPixels // maxiumHeightWantedInPixels
-            if multiple >= 2:
-                fontSize //= multiple
-            else:
-                fontSize = int(math.floor(fontSize * .98))
-            printD(f"Tried prevFontSize {prevFontSize}, yielded textHeight {textHeightPixels} vs max-wanted {maxiumHeightWantedInPixels} - next fontSize {fontSize}")
-        printV(f"Selected fontSize {fontSize}, yielding text height of {textHeightPixels} (max-wanted {maxiumHeightWantedInPixels}), vs rawHeight {rawHeight} ({textHeightPixels/rawHeight*100:.2f}%), args.fontSizePct={Config.args.fontSizePct*100:.2f}%")
-        return (textWidthPixels, textHeightPixels, defaultFont)
+@lru_cache(maxsize=None)
+def getTextHeightAtProbeFontSize(string: str, probeFontSize: int) -> int:
+
+    """
+    Measures the rendered height of a string at the probe font size used to estimate the final
+    font size. Cached per string since it doesn't depend on the height wanted
+
+    :param string: Text to measure
+    :param probeFontSize: Font size to measure at
+    :return: Height of the text's bounding box, in pixels
+    """
+
+    left, top, right, bottom = loadDefaultFont(probeFontSize).getbbox(string)
+    return max(bottom-top, 1)
+
+
+@lru_cache(maxsize=None)
+def getFontBySizeForPixelHeight(string: str, maxiumHeightWantedInPixels: int) -> Tuple[int, int, Any]:
+
+    """
+    Returns a font whose size is as close to "maxiumHeightWantedInPixels" as possible without
+    going over when rendering the supplied string. Results are cached since the same label/height
+    combination is typically requested for multiple framelines
+
+    :param string: Text to calucate font size from
+    :param maxiumHeightWantedInPixels: Maximum height of font desired, in pixels
+    :return: Tuple of (text width in pixels, text height in pixels, default font whose size meets criteria)
+    """
+
+    # rendered height scales ~linearly with font size, so measure once at a probe size and scale from there.
+    # note: the glyphs' bounding box is used rather than getmetrics() ascent+descent, which measures the full
+    # line height (including room for descenders the label's digits don't have) and would yield smaller labels
+    probeFontSize = 256
+    fontSize = max(8, int(probeFontSize * maxiumHeightWantedInPixels / getTextHeightAtProbeFontSize(string, probeFontSize)))
+    while True:
+        defaultFont = loadDefaultFont(fontSize)
+        left, top, right, bottom = defaultFont.getbbox(string)
+        textHeightPixels = int(bottom-top)
+        textWidthPixels = int(right-left)
+        if (textHeightPixels <= maxiumHeightWantedInPixels) or (fontSize == 8):
+            break
+        # scaled estimate was slightly over due to glyph hinting/rounding - step down until it fits
+        if isDebug(): printD(f"Tried fontSize {fontSize}, yielded textHeight {textHeightPixels} vs max-wanted {maxiumHeightWantedInPixels}")
+        fontSize = max(8, int(math.floor(fontSize * .98)))
+    return (textWidthPixels, textHeightPixels, defaultFont)
+
+
+def calcFramelineBox(jpgDimensions: Dimensions, rawBorders: RawBorders, aspectRatioDimensions: Dimensions) -> Tuple[int, int, int, int]:
+
+    """
+    Calculates the position and size of a frameline box with the specified aspect ratio, centered within the jpg area
+
+    :param jpgDimensions: Camera's jpg image dimensions
+    :param rawBorders: Left and top borders of the jpg area within the raw image, calculated once in run()
+    :param aspectRatioDimensions: Aspect ratio of box
+    :return: Tuple of (x, y, width, height) of box, with x,y relative to raw dimensions
+    """
 
-    rawWidth, rawHeight = rawDimensions
     jpgWidth, jpgHeight = jpgDimensions
 
     boxWidth, boxHeight = calcAspectRatioDimensions(jpgDimensions, aspectRatioDimensions)
 
-    rawBorderLeft = rawBorderRight = (rawWidth-jpgWidth)//2
-    rawBorderTop = rawBorderBottom = (rawHeight-jpgHeight)//2
-
     # calculate box starting x,y relative to jpg dimensions
     boxTopLeftInJpg_X = (jpgWidth - boxWidth)//2
     boxTopLeftInJpg_Y = (jpgHeight - boxHeight)//2
 
     # calculate box starting x,y relative to raw dimensions
-    x = rawBorderLeft + boxTopLeftInJpg_X
-    y = rawBorderTop + boxTopLeftInJpg_Y
+    x = rawBorders.left + boxTopLeftInJpg_X
+    y = rawBorders.top + boxTopLeftInJpg_Y
+
+    return (x, y, boxWidth, boxHeight)
+
+
+def drawFramelineBox(canvas: Canvas, jpgDimensions: Dimensions, rawBorders: RawBorders, aspectRatioDimensions: Dimensions, lineWidth: int, dashedLine: DashedLine, lineColor: RGB, fillColor: RGB) -> None:
+
+    """
+    Draws the box of a frameline with the specified aspect ratio that fits within the specified jpg dimensions.
+    The frameline's label is drawn separately by drawFramelineLabel(), after all the boxes have been drawn
+
+    :param canvas: Canvas to draw on
+    :param jpgDimensions: Camera's jpg image dimensions
+    :param rawBorders: Left and top borders of the jpg area within the raw image, calculated once in run()
+    :param aspectRatioDimensions: Aspect ratio of box
+    :param lineWidth: Width of lines
+    :param dashedLine: Optional dash/dashed-line specification. If not provided then solid
+    lines will be  used.
+    :param lineColor: Color of lines
+    :param fillColor: Color to fill area with
+    """
+
+    x, y, boxWidth, boxHeight = calcFramelineBox(jpgDimensions, rawBorders, aspectRatioDimensions)
 
     if (lineWidth is None) or (lineColor is None):
         lineWidth = 0
 
-    drawRectangle(draw=draw, x1=x, y1=y, x2=x+boxWidth-1, y2=y+boxHeight-1,
+    drawRectangle(canvas=canvas, x1=x, y1=y, x2=x+boxWidth-1, y2=y+boxHeight-1,
         lineWidth=lineWidth, dashedLine=dashedLine, lineColor=lineColor, fillColor=fillColor, fCompleteCorners=True)
 
-    if labelPos:
-
-        text = f"{aspectRatioDimensions.columns}:{aspectRatioDimensions.rows}"
-        textHeightInPixelsWanted = int(rawHeight*Config.args.fontSizePct)
-        textWidthPixels, textHeightPixels, font = getFontBySizeForPixelHeight(text, textHeightInPixelsWanted)
-
-        textPosOffset = 20
-        match labelPos.horzPos:
-            case HorzPos.LEFT:
-                textX = x + lineWidth + textPosOffset
-            case HorzPos.CENTER:
-                textX = x + boxWidth/2 - textWidthPixels/2 - textPosOffset
-            case HorzPos.RIGHT:
-                textX = x + boxWidth - lineWidth - textWidthPixels - textPosOffset
-        match labelPos.vertPos:
-            case VertPos.TOP:
-                textY = y + lineWidth + textPosOffset
-            case VertPos.CENTER:
-                textY = y + boxHeight/2 - textHeightPixels/2 - textPosOffset
-            case VertPos.BOTTOM:
-                textY = y + boxHeight - lineWidth - textHeightPixels - textPosOffset
-
-        draw.text((textX, textY), text, fill=lineColor, font=font, anchor="lt")
-
     printI(f"Frameline: Aspect ratio \"{aspectRatioDimensions.columns}:{aspectRatioDimensions.rows}\", resolution is {boxWidth}x{boxHeight}")
 
 
-def drawGridline(draw: ImageDraw, gridDimensions: Dimensions, rawDimensions: Dimensions, jpgDimensions: Dimensions, aspectRatioDimensions: Dimensions, lineWidth: int, dashedLine: DashedLine, lineColor: RGB) -> None:
+def drawFramelineLabel(canvas: Canvas, rawDimensions: Dimensions, jpgDimensions: Dimensions, rawBorders: RawBorders, aspectRatioDimensions: Dimensions, lineWidth: int, lineColor: RGB, labelPos: LabelPos) -> None:
+
+    """
+    Draws the aspect ratio text label of a frameline
+
+    :param canvas: Canvas to draw on
+    :param rawDimensions: Camera's raw image dimensions
+    :param jpgDimensions: Camera's jpg image dimensions
+    :param rawBorders: Left and top borders of the jpg area within the raw image, calculated once in run()
+    :param aspectRatioDimensions: Aspect ratio of box
+    :param lineWidth: Width of the box's lines, which the label is positioned inside of
+    :param lineColor: Color of the box's lines, which the label is drawn in
+    :param labelPos: Position of text label for aspect ratio
+    """
+
+    rawWidth, rawHeight = rawDimensions
+
+    x, y, boxWidth, boxHeight = calcFramelineBox(jpgDimensions, rawBorders, aspectRatioDimensions)
+
+    if (lineWidth is None) or (lineColor is None):
+        lineWidth = 0
+
+    text = f"{aspectRatioDimensions.columns}:{aspectRatioDimensions.rows}"
+    textHeightInPixelsWanted = int(rawHeight*Config.args.fontSizePct)
+    textWidthPixels, textHeightPixels, font = getFontBySizeForPixelHeight(text, textHeightInPixelsWanted)
+    if isVerbose(): printV(f"Selected fontSize {font.size}, yielding text height of {textHeightPixels} (max-wanted {textHeightInPixelsWanted}), vs rawHeight {rawHeight} ({textHeightPixels/rawHeight*100:.2f}%), args.fontSizePct={Config.args.fontSizePct*100:.2f}%")
+
+    textPosOffset = 20
+    match labelPos.horzPos:
+        case HorzPos.LEFT:
+            textX = x + lineWidth + textPosOffset
+        case HorzPos.CENTER:
+            textX = x + boxWidth/2 - textWidthPixels/2 - textPosOffset
+        case HorzPos.RIGHT:
+            textX = x + boxWidth - lineWidth - textWidthPixels - textPosOffset
+    match labelPos.vertPos:
+        case VertPos.TOP:
+            textY = y + lineWidth + textPosOffset
+        case VertPos.CENTER:
+            textY = y + boxHeight/2 - textHeightPixels/2 - textPosOffset
+        case VertPos.BOTTOM:
+            textY = y + boxHeight - lineWidth - textHeightPixels - textPosOffset
+
+    canvas.drawText(textX, textY, text, lineColor, font)
+
+
+def drawGridline(canvas: Canvas, gridDimensions: Dimensions, rawDimensions: Dimensions, jpgDimensions: Dimensions, rawBorders: RawBorders, aspectRatioDimensions: Dimensions, lineWidth: int, dashedLine: DashedLine, lineColor: RGB) -> None:
 
     """
     Draws gridlines with the specified dimensions
 
-    :param draw: Canvas to draw on
+    :param canvas: Canvas to draw on
     :param gridDimensions: Dimensions with number of column and row segments.
     :param rawDimensions: Camera's raw image dimensions
     :param jpgDimensions: Camera's jpg image dimensions
+    :param rawBorders: Left and top borders of the jpg area within the raw image, calculated once in run()
     :param aspectRatioDimensions: Aspect ratio to constrain gridlines to, or None to use jpgDImensions as only constraint
     :param lineWidth: Width of lines
     :param dashedLine: Optional dash/dashed-line specification. If not provided then solid lines will be drawn.
@@ -929,7 +1170,6 @@ def drawGridline(draw: ImageDraw, gridDimensions: Dimensions, rawDimensions: Dim
     :param fillColor: Color to fill area with
     """
 
-    rawWidth, rawHeight = rawDimensions
     jpgWidth, jpgHeight = jpgDimensions
 
     if aspectRatioDimensions:
@@ -937,24 +1177,30 @@ def drawGridline(draw: ImageDraw, gridDimensions: Dimensions, rawDimensions: Dim
     else:
         drawWidth, drawHeight = jpgDimensions
 
-    rawBorderLeft = rawBorderRight = (rawWidth-jpgWidth)//2
-    rawBorderTop = rawBorderBottom = (rawHeight-jpgHeight)//2
-
     # calculate starting x,y of drawing area relative to raw dimensions
-    xOrigin = rawBorderLeft + (jpgWidth - drawWidth)//2
-    yOrigin = rawBorderTop + (jpgHeight - drawHeight)//2
+    xOrigin = rawBorders.left + (jpgWidth - drawWidth)//2
+    yOrigin = rawBorders.top + (jpgHeight - drawHeight)//2
+
+    # every gridline has the same width and segments along its axis, so calculate those once and only
+    # offset the position for each line. widthStart/widthEnd are the width's span relative to the line's coordinate
+    widthStart, widthEnd = calcLineWidthExpansion(0, lineWidth, LineWidthExpansion.EXPAND_CENTERED)
+    fHasWidth = widthEnd > widthStart
 
     # draw columns (vertical lines)
-    if gridDimensions.columns:
+    if gridDimensions.columns and fHasWidth:
         pixelsPerColumn = (drawWidth // gridDimensions.columns) + (drawWidth % gridDimensions.columns != 0)
-        for x in range(pixelsPerColumn, drawWidth, pixelsPerColumn):
-            drawVertLine(draw=draw, y1=yOrigin, y2=yOrigin+drawHeight, x=x+xOrigin, lineWidth=lineWidth, lineWidthExpansion=LineWidthExpansion.EXPAND_CENTERED, dashedLine=dashedLine, lineColor=lineColor, fCompleteDashedLineEdge=True)
+        xs = np.arange(pixelsPerColumn, drawWidth, pixelsPerColumn) + (xOrigin + widthStart)
+        segments = calcDashedLineSegments(yOrigin, yOrigin+drawHeight, dashedLine, fCompleteDashedLineEdge=True)
+        for x in xs.tolist():
+            drawSolidVertLineSegments(canvas, segments, x, x + (widthEnd-widthStart), lineColor)
 
     # draw row (horizontal lines)
-    if gridDimensions.rows:
+    if gridDimensions.rows and fHasWidth:
         pixelsPerRow = (drawHeight // gridDimensions.rows) + (drawHeight % gridDimensions.rows != 0)
-        for y in range(pixelsPerRow, drawHeight, pixelsPerRow):
-            drawHorzLine(draw=draw, x1=xOrigin, x2=xOrigin+drawWidth, y=y+yOrigin, lineWidth=lineWidth, lineWidthExpansion=LineWidthExpansion.EXPAND_CENTERED, dashedLine=dashedLine, lineColor=lineColor, fCompleteDashedLineEdge=True)
+        ys = np.arange(pixelsPerRow, drawHeight, pixelsPerRow) + (yOrigin + widthStart)
+        segments = calcDashedLineSegments(xOrigin, xOrigin+drawWidth, dashedLine, fCompleteDashedLineEdge=True)
+        for y in ys.tolist():
+            drawSolidHorzLineSegments(canvas, segments, y, y + (widthEnd-widthStart), lineColor)
 
     # info print
     if aspectRatioDimensions:
@@ -977,7 +1223,14 @@ def run() -> bool:
         return True
 
     printI(f"{AppName} v{AppVersion}")
-    printD(f"Args: {args}")
+    if isDebug(): printD(f"Args: {args}")
+
+    # img2nef is only needed to generate an NEF. verify its modules and import it up front, so
+    # that a missing module is reported before we do any work rather than after the overlay is drawn
+    if args.generatenef:
+        verifyRequiredModulesInstalled(Img2nefRequiredModules)
+        global img2nef
+        import img2nef
 
     # get raw and jpg dimensions, either form camera or those manually specified
     if args.camera:
@@ -1003,37 +1256,52 @@ def run() -> bool:
         printE("Raw dimensions must be >= jpg dimensions on both axis")
         return True
 
+    # the jpg area is centered within the raw image. calculate its borders once for all the framelines/gridlines
+    rawBorders = RawBorders(left=(rawDimensions.columns-jpgDimensions.columns)//2, top=(rawDimensions.rows-jpgDimensions.rows)//2)
+
+    # determine the output filename before drawing anything, so that --ifexists EXIT exits early
+    outputFilename = generateOutputFilename()
+
     # draw framelines
-    img = Image.new('RGB', (rawDimensions.columns, rawDimensions.rows), args.backgroundColor)
-    draw = ImageDraw.Draw(img)
+    canvas = Canvas(rawDimensions, args.backgroundColor)
     for frameline in args.framelines:
-        drawFrameline(draw,
-            rawDimensions,
+        drawFramelineBox(canvas,
             jpgDimensions,
+            rawBorders,
             frameline.aspectRatio,
             lineWidth=frameline.lineWidth,
             dashedLine=frameline.dashedLine,
             lineColor=frameline.lineColor,
-            fillColor=frameline.fillColor,
-            labelPos=frameline.labelPos)
+            fillColor=frameline.fillColor)
+
+    # draw frameline labels. done as a separate pass after all the boxes so that the queued box fills are
+    # only flushed out once before the first label, rather than before each label
+    for frameline in args.framelines:
+        if frameline.labelPos:
+            drawFramelineLabel(canvas,
+                rawDimensions,
+                jpgDimensions,
+                rawBorders,
+                frameline.aspectRatio,
+                lineWidth=frameline.lineWidth,
+                lineColor=frameline.lineColor,
+                labelPos=frameline.labelPos)
 
     # draw gridlines
     for gridline in args.gridlines:
-        drawGridline(draw=draw,
+        drawGridline(canvas=canvas,
             gridDimensions=gridline.gridDimensions,
             rawDimensions=rawDimensions,
             jpgDimensions=jpgDimensions,
+            rawBorders=rawBorders,
             aspectRatioDimensions=gridline.aspectRatio,
             lineWidth=gridline.lineWidth,
             dashedLine=gridline.dashedLine,
             lineColor=gridline.lineColor)
 
     # Save the generated image
-    outputFilename = generateOutputFilename()
-    try:
-        img.save(outputFilename)
-    except Exception as e:
-        printE(f"Unable to save output to \"{outputFilename}, error: {e}")
+    fError, outputFilename = saveOutputImage(canvas.toImage(), outputFilename)
+    if fError:
         return True
     printI(f"Successfully generated \"{os.path.realpath(outputFilename)}\"")
 
@@ -17,11 +17,13 @@ image into Nikon's proprietary NEF lossless compression.
 
 """
 
+from __future__ import annotations # type hints reference numpy, which isn't imported until we know we'll be using it
+
 #
 # verify python version early, before executing any logic that relies on features not available in all versions
 #
 import sys
-if (sys.version_info.major < 3) or (sys.version_info.minor < 10):
+if sys.version_info < (3, 10):
     print("Requires Python v3.10 or later but you're running v{}.{}.{}".format(sys.version_info.major, sys.version_info.minor, sys.version_info.micro))
     sys.exit(1)
 
@@ -30,12 +32,17 @@ if (sys.version_info.major < 3) or (sys.version_info.minor < 10):
 #
 import argparse
 import ctypes
+from   concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from   dataclasses import dataclass
 from   enum import Enum
-from   functools import partial
+from   functools import lru_cache, partial
+import glob
 import importlib
+import importlib.util
 from   io import BytesIO
+from   itertools import chain
 import math
+import mmap
 import os
 import platform
 import re
@@ -43,7 +50,6 @@ import struct
 import subprocess
 import sys
 import time
-import types
 from   typing import Any, Callable, List, NamedTuple, Tuple, Type
 
 
@@ -57,13 +63,42 @@ class Verbosity(Enum): SILENT=0; WARNING=1; INFO=2; VERBOSE=3; DEBUG=4
 class Endian(Enum): LITTLE=0; BIG=1
 class OutputFilenameMethod(Enum): TEMPLATENEF_AND_INPUTFILE=0; TEMPLATENEF=1; INPUTFILE=2; NONE=3
 
-Coordinate = NamedTuple('Coordinate', [('x', int), ('y', int)])
-Dimensions = NamedTuple('Dimensions', [('columns', int), ('rows', int)])
-Rect = NamedTuple('Rect', [('startx', int), ('starty', int), ('endx', int), ('endy', int)]) # ending values are exclusive
-SrcGeomAdjustments = NamedTuple('SrcGeomAdjustments', [('resizeDimensions', Dimensions), ('posInTgt', Coordinate), ('cropRect', Rect)])
-WhiteBalanceMultipliers = NamedTuple('WhiteBalanceMultipliers', [('red', float), ('blue', float)])
-NikonCropArea = NamedTuple('NikonCropArea', [('left', int), ('top', int), ('columns', int), ('rows', int)])
-EmbeddedJpgExifInfo = NamedTuple('EmbeddedJpg', [('exifName', str), ('start', int), ('length', int), ('offsetToLengthField', int)])
+@dataclass(slots=True, frozen=True)
+class Coordinate: x: int; y: int
+@dataclass(slots=True, frozen=True)
+class Dimensions: columns: int; rows: int
+@dataclass(slots=True, frozen=True)
+class Rect: startx: int; starty: int; endx: int; endy: int # ending values are exclusive
+@dataclass(slots=True, frozen=True)
+class SrcGeomAdjustments: resizeDimensions: Dimensions | None; posInTgt: Coordinate; cropRect: Rect | None
+@dataclass(slots=True, frozen=True)
+class WhiteBalanceMultipliers: red: float; blue: float
+@dataclass(slots=True, frozen=True)
+class NikonCropArea: left: int; top: int; columns: int; rows: int
+@dataclass(slots=True, frozen=True)
+class EmbeddedJpgExifInfo: exifName: str; start: int; length: int; offsetToLengthField: int
+@dataclass(slots=True, frozen=True)
+class TiffIfdEntry: fieldType: int; count: int; offsetToValue: int # offsetToValue is absolute file offset
+
+@dataclass(slots=True)
+class TemplateNefExif:  # EXIF info we need from the template NEF, filled in by the extractExifFromNEF*() methods
+    endian: Endian = None
+    cameraModel: str = None
+    embeddedJpgs: List[EmbeddedJpgExifInfo] = None
+    rawDimensions: Dimensions = None
+    bitsPerSample: int = None
+    stripOffset: int = None
+    stripByteCount: int = None
+    fileOffsetToStripByteCount: int = None
+    wbMultipliers: WhiteBalanceMultipliers = None
+    nefCompressionType: int = None
+    blackLevel: int = None
+    predValueNefCompression: int = None
+    cropAreaDimensions: NikonCropArea | None = None
+@dataclass(slots=True)
+class AppConfig:
+    args: argparse.Namespace = None # processed command line
+    exif: TemplateNefExif = None    # EXIF info of template NEF
 
 
 #
@@ -71,51 +106,105 @@ EmbeddedJpgExifInfo = NamedTuple('EmbeddedJpg', [('exifName', str), ('start', in
 #
 AppName = "img2nef"
 AppVersion = "1.00"
-ResizeAlgoNames = ['LANCZOS4', 'CUBIC', 'AREA', 'LINEAR', 'NEAREST']
+ResizeAlgoInterpolationFlags = {'LANCZOS4': 4, 'CUBIC': 2, 'AREA': 3, 'LINEAR': 1, 'NEAREST': 0} # cv2.INTER_* values, so the cmd line can be processed without importing cv2
+ResizeAlgoNames = list(ResizeAlgoInterpolationFlags)
 AlignmentStrs = [x.name for x in Alignment]
 ResizeGeomStrs = [x.name for x in ResizeGeom]
 IfFileExistsStrs = [x.name for x in IfFileExists]
 OutputFilenameMethodStrs = [x.name for x in OutputFilenameMethod]
 VerbosityStrs = [x.name for x in Verbosity]
-Config = types.SimpleNamespace()
+Config = AppConfig()
+PrefetchedImages = dict() # filename -> Future of cv2.imread() for images being loaded ahead by prefetchImage()
 ImgFloatType = "float32"
+BayerPhaseBandRows = 64 # rows per band in src_PerformBayerPhaseInBands(); must be even to preserve the RGGB phase of each band, which selects its LUT
+ResizeOpenCLMinPixelProduct = 10**10 # min (source pixels * resized pixels) for --re.opencl to resize on the device; below that the copies to/from the device cost more than the resize saves
 EmbeddedJpgExifNames = ["JpgFromRaw", "OtherImage", "PreviewImage", "Thumbnail"]
+TiffFieldTypeSizes = {1:1, 2:1, 3:2, 4:4, 5:8, 6:1, 7:1, 8:2, 9:4, 10:8, 11:4, 12:8, 13:4} # TIFF field type -> size of each element, in bytes
+TiffIfdEntryStructs = {endianPrefix: struct.Struct(endianPrefix + 'HHII') for endianPrefix in '<>'} # tag, type, count, value/offset of a 12-byte IFD entry, by byte order
+JpgSofMarkers = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC} # JPEG start-of-frame markers (0xC4/0xC8/0xCC in that range are DHT/JPG/DAC)
+JpgStandaloneMarkers = frozenset(range(0xD0, 0xDA)) | {0x01} # JPEG markers without a length/payload (RSTn, SOI, EOI, TEM)
 
 #
-# verify all optional modules we need are installed before we attempt to import them.
-# this allows us to display a user-friendly message for the missing modules instead of the
-# python-generated error message for missing imports
+# single compiled regex for scanning exiftool's -v3 output in one pass, used by scanExiftoolOutput(). it's a
+# bytes pattern so the output can be scanned as captured, without first decoding it to str (which also means
+# line endings aren't translated, so values that run to the end of their line exclude any '\r'). each
+# alternative's outer group names the field (m.lastgroup), with the field's values in its inner groups.
+# "IFD0", "SubfileType0", "ExifIFD" and "MakerNotes" are anchors that mark the sections of the output. the
+# fields whose value is on a following hex-dump line match the "| | ..." tree prefix of those lines literally
+# rather than with a lazy ".*?", so that locating the dump offset doesn't backtrack through the line
 #
-if __name__ == "__main__":
-    def verifyRequiredModulesInstalled():
-        RequiredModule = NamedTuple('RequiredModule', [('importName', str), ('pipInstallName', str)])
-        requiredModules = [
-            RequiredModule(importName="cv2", pipInstallName="opencv-python"),
-            RequiredModule(importName="PIL", pipInstallName="pillow"),
-            RequiredModule(importName="numpy", pipInstallName="numpy"),
-        ]
-        missingModules = list()
-        for requiredModule in requiredModules:
-            try:
-                importlib.import_module(requiredModule.importName)
-            except ImportError:
-                missingModules.append(requiredModule)
-        if missingModules:
-            print(f"Run the following commands to install required modules before using {AppName}:\n")
-            for requiredModule in missingModules:
-                print(f"\tpip install {requiredModule.pipInstallName}")
-            print("")
-            sys.exit(1)
-
-    verifyRequiredModulesInstalled()
+ExiftoolOutputPattern = re.compile(b'|'.join([
+    rb'(?P<FileType>FileType = ([^\r\n]+))',
+    rb'(?P<ExifByteOrder>ExifByteOrder = ([^\r\n]+))',
+    rb'(?P<IFD0>\+ \[IFD0 directory)',
+    rb'(?P<Model>Model = ([^\r\n]+))',
+    rb'(?P<PreviewImageStart>Preview Image Start\s+: ([^\r\n]+))',                      # sample: "Preview Image Start             : 104744"
+    rb'(?P<EmbeddedJpgStart>(\w+(?:Start|Offset)) = (\d+))',                        # ex: "JpgFromRawStart = 1190912", "ThumbnailOffset = 232484"
+    rb'(?P<EmbeddedJpgLength>(\w+Length) = (\d+).*\n[ |]*- Tag .*\n[ |]*([0-9a-f]+):)',
+    rb'(?P<SubfileType0>SubfileType = 0)',
+    rb'(?P<ImageWidth>ImageWidth = (\d+))',
+    rb'(?P<ImageHeight>ImageHeight = (\d+))',
+    rb'(?P<BitsPerSample>BitsPerSample = (\d+))',
+    rb'(?P<StripOffsets>StripOffsets = (\d+))',
+    rb'(?P<StripByteCounts>StripByteCounts = (\d+).*\n[ |]*- Tag .*\n[ |]*([0-9a-f]+):)',
+    rb'(?P<ExifIFD>ExifIFD directory)',
+    rb'(?P<MakerNotes>MakerNotes directory)',
+    rb'(?P<WB_RBLevels>WB_RBLevels = ([\d\.]+) ([\d\.]+))',
+    rb'(?P<NEFCompression>NEFCompression = (\d+))',
+    rb'(?P<BlackLevel>BlackLevel = (\d+))',
+    rb'(?P<NEFLinearizationTable>NEFLinearizationTable .*\n[ |]*- Tag .*\n[ |]*[0-9a-f]+: [0-9a-f][0-9a-f] [0-9a-f][0-9a-f] ([0-9a-f][0-9a-f]) ([0-9a-f][0-9a-f]))',
+    rb'(?P<CropArea>CropArea = (\d+) (\d+) (\d+) (\d+))',
+]))
+# section (anchor) of the exiftool output each field is taken from - its first occurrence after the anchor. None means anywhere
+ExiftoolFieldSections = {
+    'FileType': None, 'ExifByteOrder': None, 'IFD0': None, 'PreviewImageStart': None,
+    'Model': 'IFD0', 'EmbeddedJpgStart': 'IFD0', 'EmbeddedJpgLength': 'IFD0', 'SubfileType0': 'IFD0', 'ExifIFD': 'IFD0',
+    'ImageWidth': 'SubfileType0', 'ImageHeight': 'SubfileType0', 'BitsPerSample': 'SubfileType0', 'StripOffsets': 'SubfileType0', 'StripByteCounts': 'SubfileType0',
+    'MakerNotes': 'ExifIFD', 'WB_RBLevels': 'ExifIFD', 'NEFCompression': 'ExifIFD', 'BlackLevel': 'ExifIFD', 'NEFLinearizationTable': 'ExifIFD', 'CropArea': 'ExifIFD',
+}
+ExiftoolMultiInstanceFields = frozenset(['EmbeddedJpgStart', 'EmbeddedJpgLength']) # fields collected for each EXIF name, as a dict
 
 
 #
-# import optional modules now we've established they're available
+# import the optional modules. this is deferred until the command line has been successfully processed, so
+# that --help and command-line errors don't pay the considerable import time of cv2/PIL/numpy. we verify all
+# the modules are installed before we attempt to import them, which allows us to display a user-friendly
+# message for the missing modules instead of the python-generated error message for missing imports
 #
-import cv2
-from   PIL import Image, ImageDraw, ImageFont
-import numpy as np
+def importOptionalModules() -> bool:
+
+    """
+    Imports the optional modules (cv2, PIL, numpy) into our module's namespace
+
+    :return: False if successful, True if one or more modules are not installed
+    """
+
+    global cv2, Image, ImageDraw, ImageFont, np
+
+    RequiredModule = NamedTuple('RequiredModule', [('importName', str), ('pipInstallName', str)])
+    requiredModules = [
+        RequiredModule(importName="cv2", pipInstallName="opencv-python"),
+        RequiredModule(importName="PIL", pipInstallName="pillow"),
+        RequiredModule(importName="numpy", pipInstallName="numpy"),
+    ]
+    # find_spec() only locates each module, without the cost of executing it like an import would
+    missingModules = [requiredModule for requiredModule in requiredModules if importlib.util.find_spec(requiredModule.importName) is None]
+    if missingModules:
+        print(f"Run the following commands to install required modules before using {AppName}:\n")
+        for requiredModule in missingModules:
+            print(f"\tpip install {requiredModule.pipInstallName}")
+        print("")
+        return True
+
+    try:
+        import cv2
+        from   PIL import Image, ImageDraw, ImageFont
+        import numpy as np
+    except ImportError as e:
+        # module is installed but failed to load (ex: missing/mismatched binary dependency)
+        print(f"Unable to load required module: {e}")
+        return True
+    return False
 
 
 #
@@ -125,23 +214,30 @@ def isVerbose() -> bool:
     return Config.args.verbosity.value >= Verbosity.VERBOSE.value
 def printA(string: str): # print "always"
     print(string)
-def printIfVerbosityAllows(string: str, requiredVerbosityLevel: Verbosity) -> None:
-    if hasattr(Config, "args"):
-        if Config.args.verbosity.value >= requiredVerbosityLevel.value:
-            printA(string)
-    else:
-        # called before we've initialized Config.args
-        printA(string)
 def printE(string: str): # print error
     printA(f"ERROR: {string}")
-def printW(string: str): # print warnings, if verbosity config allows
-    printIfVerbosityAllows(f"WARNING: {string}", Verbosity.WARNING)
-def printI(string: str): # print "informational" messages, if verbosity config allows
-    printIfVerbosityAllows(f"INFO: {string}", Verbosity.INFO)
-def printV(string: str): # print "verbose" messages, if verbosity config allows
-    printIfVerbosityAllows(f"VERBOSE: {string}", Verbosity.VERBOSE)
-def printD(string: str): # print "debug" messages, if verbosity config allows
-    printIfVerbosityAllows(f"DEBUG: {string}", Verbosity.DEBUG)
+def printWarning(string: str):
+    printA(f"WARNING: {string}")
+def printInfo(string: str):
+    printA(f"INFO: {string}")
+def printVerbose(string: str):
+    printA(f"VERBOSE: {string}")
+def printDebug(string: str):
+    printA(f"DEBUG: {string}")
+def printNothing(string: str): # stands in for the print methods whose verbosity level isn't enabled
+    pass
+
+#
+# printW/printI/printV/printD print "warning", "informational", "verbose" and "debug" messages if the
+# verbosity config allows. configurePrintMethods() binds each to either its print method above or to
+# printNothing once the verbosity is known, so individual calls don't have to check the verbosity.
+# until then (ie, before we've initialized Config.args) all messages are printed
+#
+printW, printI, printV, printD = printWarning, printInfo, printVerbose, printDebug
+VerbosityPrintMethods = [(Verbosity.WARNING, printWarning), (Verbosity.INFO, printInfo), (Verbosity.VERBOSE, printVerbose), (Verbosity.DEBUG, printDebug)]
+def configurePrintMethods(verbosity: Verbosity) -> None:
+    global printW, printI, printV, printD
+    printW, printI, printV, printD = (printMethod if verbosity.value >= requiredVerbosity.value else printNothing for (requiredVerbosity, printMethod) in VerbosityPrintMethods)
 
 
 def getScriptDir() -> str:
@@ -166,9 +262,12 @@ def openFileInOS(filename: str) -> bool:
     printV(f"Opening \"{os.path.realpath(filename)}\" in default system image viewer")
     try:
         if platform.system() == "Windows":
-            os.startfile(filename)
-        else: # both Linux and Darwin (aka Mac) use "open"
-            subprocess.call(['open', filename])
+            os.startfile(filename) # already returns without waiting for the viewer
+        else:
+            # Darwin (aka Mac) uses "open", Linux uses "xdg-open". launch without waiting on it, since some
+            # desktop environments don't return until the viewer exits
+            opener = 'open' if platform.system() == "Darwin" else 'xdg-open'
+            subprocess.Popen([opener, filename], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
     except Exception as e:
         printW(f"Unable to open file \"{filename}\" in your OS's file viewer, error: {e}")
         return True
@@ -201,11 +300,11 @@ def processCmdLine() -> argparse.Namespace:
 
     # converts comma-separated string to a list of floats
     def commaSeparatedFloatListForArg(string: str) -> List[float]:
-        return [float(item.strip()) for item in string.split(',')]
+        return list(map(float, string.split(',')))  # float() ignores surrounding whitespace
 
     # converts comma-separated string to a list of ints
     def commaSeparatedIntListForArg(string: str) -> List[int]:
-        return [int(item.strip()) for item in string.split(',')]
+        return list(map(int, string.split(',')))    # int() ignores surrounding whitespace
 
     # converts string to hex value
     def strToHex(string: str) -> int:
@@ -214,10 +313,7 @@ def processCmdLine() -> argparse.Namespace:
 
     # removes one nesting of list. Ex: [[1.0, 0.5, 1.0]] -> [1.0, 0.5, 1.0]
     def flattenList(listToFlatten: List) -> List:
-        flattenedList = list()
-        for item in listToFlatten:
-            flattenedList.extend(item)
-        return flattenedList
+        return list(chain.from_iterable(listToFlatten))
 
     # arg parser that throws exceptions on errors
     parser = ArgumentParserWithException(fromfile_prefix_chars='!',\
@@ -233,6 +329,8 @@ def processCmdLine() -> argparse.Namespace:
     parser.add_argument('inputfilename', metavar="<image filename>", help="Required: Input file, typically an image (ex: TIF, JPG, PNG) but Numpy (.npy) files of certain shapes are also supported.")
     parser.add_argument('outputfilename', nargs="?", metavar="<output filename>", help="Optional - If not specified, name will be automatically generated using the the method defined by --outputfilenamemethod.")
     parser.add_argument('--embeddedimg', metavar="<image filename>", type=str, help="Use a different image for the embedded jpgs. Default is to use the image data from <inputfilename>, ie same image that's used to generated the raw data.", required=False)
+    parser.add_argument('--batch', type=strValueToBool, nargs='?', default=False, const=True, metavar="yes/no", help="Treat <image filename> as a wildcard pattern (ex: \"*.jpg\") and convert every file matching it, running the conversions in parallel. Output filenames are generated via --outputfilenamemethod. Default is %(default)s.")
+    parser.add_argument('--batchworkers', type=int, default=os.cpu_count(), metavar="<count>", help="Maximum number of conversions to run in parallel when --batch is enabled. Default is %(default)s (the number of CPUs).")
     parser.add_argument('--openinviewer', type=strValueToBool, nargs='?', default=False, const=True, metavar="yes/no", help="Open generated NEF in default image editor after creating. Default is %(default)s.")
     parser.add_argument('--outputdir', type=str, metavar="<path>", help="Directory to store image/file(s) to.  Default is current directory. If path contains any spaces enclose it in double quotes. Example: --outputdir \"c:\\My Documents\"", default=None, required=False)
     parser.add_argument('--outputfilenamemethod', type=str.upper, choices=OutputFilenameMethodStrs, default='TEMPLATENEF_AND_INPUTFILE', required=False, help="""Method used to automatically generate output filename when not explicitly specified.
@@ -259,6 +357,7 @@ def processCmdLine() -> argparse.Namespace:
         resizing is disabled via --re.geometry=NONE and source image is 2000x2000, a 6000x4000 raw will have 1500 padding pixels on both horizontal sides, with source image centered in frame. Default is %(default)s.""")
     resizeOptions.add_argument('--re.vertalign', dest='re_vertalign', type=str.upper, choices=AlignmentStrs, default="CENTER", required=False, help="Resizing: Vertical alignment of source image position or crop. Default is %(default)s.")
     resizeOptions.add_argument('--re.resizealgo', dest='re_algorithm', type=str.upper, choices=ResizeAlgoNames, default='LANCZOS4', required=False, help="Resizing: Algorithm to use to resize source pixels. Default is %(default)s.")
+    resizeOptions.add_argument('--re.opencl', dest='re_opencl', type=strValueToBool, nargs='?', default=False, const=True, metavar="yes/no", help="Resizing: Use OpenCL (typically the GPU) for large resizes when available. Default is %(default)s.")
     resizeOptions.add_argument('--re.borderfillcolor', dest='re_borderfillcolor', type=strToHex, default='#000000', required=False, metavar="#RRGGBB (hex)", help="Resizing: Border color when source image doesn't fill out raw frame for resize parameters used.  Default is %(default)s.")
 
     troubleshootingOptions = parser.add_argument_group("Troubleshooting Options", "These options help in troubleshooting issues")
@@ -299,11 +398,79 @@ def processCmdLine() -> argparse.Namespace:
     if args.src_wbmultipliers:                          # convert from list to WhiteBalanceMultipliers
         args.src_wbmultipliers = WhiteBalanceMultipliers(red=args.src_wbmultipliers[0][0], blue=args.src_wbmultipliers[0][1])
 
-    args.re_algorithm = getattr(cv2, "INTER_" + args.re_algorithm) # convert algorithm as string into enumerated cv2 value
+    args.re_algorithm = ResizeAlgoInterpolationFlags[args.re_algorithm] # convert algorithm as string into enumerated cv2 value
+    args.re_borderfillcolor = tuple((args.re_borderfillcolor >> channelShift) & 0xff for channelShift in (0, 8, 16)) # convert from 0xRRGGBB into 8-bit values in cv2's (B, G, R) channel order
+
+    if args.batch:
+        # each file in a batch needs its own automatically-generated output filename
+        if args.outputfilename:
+            print("Command line error: <output filename> can't be specified with --batch. Use --outputdir and --outputfilenamemethod instead")
+            return None
+        if args.outputfilenamemethod in (OutputFilenameMethod.NONE, OutputFilenameMethod.TEMPLATENEF):
+            print(f"Command line error: --outputfilenamemethod {args.outputfilenamemethod.name} doesn't generate a separate output filename for each file of a --batch")
+            return None
+        if args.batchworkers < 1:
+            print(f"Command line error: --batchworkers must be at least 1")
+            return None
 
     return args
 
 
+#
+# per-alignment crop and position calculations for a single axis, used by calcSrcGeomAdjustments().
+# crop functions take (srcAmount, tgtAmount, amountToCrop) and return the (start, end) of the crop
+# on the axis (end exclusive). position functions take (srcAmount, tgtAmount, amountShort) and return
+# the position in the target
+#
+def calcAxisCropLeading(srcAmount: int, tgtAmount: int, amountToCrop: int) -> Tuple[int, int]:
+    return (0, tgtAmount)
+
+def calcAxisCropCenter(srcAmount: int, tgtAmount: int, amountToCrop: int) -> Tuple[int, int]:
+    half = amountToCrop >> 1 # for odd crop amounts the extra pixel is cropped from the end
+    return (half, srcAmount - (amountToCrop - half))
+
+def calcAxisCropTrailing(srcAmount: int, tgtAmount: int, amountToCrop: int) -> Tuple[int, int]:
+    return (amountToCrop, srcAmount)
+
+def calcAxisPosLeading(srcAmount: int, tgtAmount: int, amountShort: int) -> int:
+    return 0
+
+def calcAxisPosCenter(srcAmount: int, tgtAmount: int, amountShort: int) -> int:
+    return amountShort >> 1
+
+def calcAxisPosTrailing(srcAmount: int, tgtAmount: int, amountShort: int) -> int:
+    return amountShort
+
+AxisCropFuncs = {
+    Alignment.LEFT.value: calcAxisCropLeading, Alignment.TOP.value: calcAxisCropLeading,
+    Alignment.CENTER.value: calcAxisCropCenter,
+    Alignment.RIGHT.value: calcAxisCropTrailing, Alignment.BOTTOM.value: calcAxisCropTrailing,
+}
+AxisPosFuncs = {
+    Alignment.LEFT.value: calcAxisPosLeading, Alignment.TOP.value: calcAxisPosLeading,
+    Alignment.CENTER.value: calcAxisPosCenter,
+    Alignment.RIGHT.value: calcAxisPosTrailing, Alignment.BOTTOM.value: calcAxisPosTrailing,
+}
+
+
+def scaleIntRounded(value: int, numerator: int, denominator: int) -> int:
+
+    """
+    Scales an integer by a ratio using integer-only math, rounding the same way
+    as int(round()) (ie, halfway cases round to even)
+
+    :param value: Value to scale
+    :param numerator: Numerator of scaling ratio
+    :param denominator: Denominator of scaling ratio
+    :return: value * numerator / denominator, rounded to nearest int
+    """
+
+    quotient, remainder = divmod(value * numerator, denominator)
+    if (remainder*2 > denominator) or (remainder*2 == denominator and (quotient & 1)):
+        quotient += 1
+    return quotient
+
+
 def calcSrcGeomAdjustments(srcDimensions: Dimensions, tgtDimensions: Dimensions, resizeGeom: ResizeGeom, fMaintainAspectRatio: bool, horzAlignment: Alignment, vertAlignment: Alignment) -> SrcGeomAdjustments:
 
     """
@@ -319,44 +486,6 @@ def calcSrcGeomAdjustments(srcDimensions: Dimensions, tgtDimensions: Dimensions,
     :return: SrcGeomAdjustments, which specifies the adjustments that need to be made on the source image
     """
 
-    def calcAxisCrop(srcAmount: int, tgtAmount: int, alignment: Alignment):
-        if srcAmount <= tgtAmount:
-            # not larger on column axis, no cropping on this axis is necessary
-            start = 0; end = srcAmount
-        else:
-            amountToCrop = srcAmount - tgtAmount
-            match alignment:
-                case Alignment.LEFT | Alignment.TOP:
-                    start = 0
-                    end = tgtAmount
-                case Alignment.CENTER:
-                    start = int(round(amountToCrop / 2))
-                    end = int(round(srcAmount - (amountToCrop / 2) - (amountToCrop % 2))) # % 2 to handle odd crop amounts
-                case Alignment.RIGHT | Alignment.BOTTOM:
-                    start = amountToCrop
-                    end = tgtAmount
-                case _:
-                    assert False, f"Uknown {alignment=}"
-        return (start, end)
-
-    def calcAxisPos(srcAmount: int, tgtAmount: int, alignment: Alignment):
-        if srcAmount >= tgtAmount:
-            # src is equal or larger than target, position at 0 in target
-            pos = 0
-        else:
-            amountShort = tgtAmount - srcAmount
-            match alignment:
-                case Alignment.LEFT | Alignment.TOP:
-                    pos = 0
-                case Alignment.CENTER:
-                    pos = int((tgtAmount/2) - (srcAmount/2))
-                case Alignment.RIGHT | Alignment.BOTTOM:
-                    pos = tgtAmount-srcAmount
-                case _:
-                    assert False, f"Uknown {alignment=}"
-        return pos
-
-
     if srcDimensions == tgtDimensions:
         # already at target dimensions, nothing to do
         return None
@@ -379,26 +508,21 @@ def calcSrcGeomAdjustments(srcDimensions: Dimensions, tgtDimensions: Dimensions,
                     # src rows needs to be enlarged, leve src columns the same
                     resizeDimensions = Dimensions(columns=srcDimensions.columns, rows=tgtDimensions.rows)
             else:
-                # need to maintain aspect ratio. determine which axis to enlarge
-                columnMultiplier = tgtDimensions.columns / srcDimensions.columns
-                rowMultiplier = tgtDimensions.rows / srcDimensions.rows
-                if columnMultiplier < rowMultiplier:
+                # need to maintain aspect ratio. determine which axis to enlarge. the multipliers (tgt/src) are compared via
+                # integer cross-multiplication so that FP roundoff can't pick the wrong axis or drift the resulting size
+                if tgtDimensions.columns * srcDimensions.rows < tgtDimensions.rows * srcDimensions.columns:
                     # long edge is column side, so enlarge columns to tgt dimensions and rows to whatever size the aspect ratio allows
-                    resizeDimensions = Dimensions(columns=tgtDimensions.columns, rows=int(round(srcDimensions.rows * columnMultiplier)))
+                    resizeDimensions = Dimensions(columns=tgtDimensions.columns, rows=scaleIntRounded(srcDimensions.rows, tgtDimensions.columns, srcDimensions.columns))
                 else:
                     # long edge is row side, so enlarge rows to tgt dimensions and cols to whatever size the aspect ratio allows
-                    resizeDimensions = Dimensions(columns=int(round(srcDimensions.columns * rowMultiplier)), rows=tgtDimensions.rows)
+                    resizeDimensions = Dimensions(columns=scaleIntRounded(srcDimensions.columns, tgtDimensions.rows, srcDimensions.rows), rows=tgtDimensions.rows)
         elif resizeGeom == ResizeGeom.FULL:
-            if srcDimensions.columns < tgtDimensions.columns:
-                columnMultiplier = tgtDimensions.columns / srcDimensions.columns
-            else:
-                columnMultiplier = 1
-            if srcDimensions.rows*columnMultiplier < tgtDimensions.rows:
-                rowMultiplier = tgtDimensions.rows / (srcDimensions.rows * columnMultiplier)
+            # enlarge by the larger of the two multipliers (tgt/src) so that both axis are at least the tgt size. the axis
+            # with the larger multiplier lands exactly on the tgt size (including when the aspect ratios are equal)
+            if tgtDimensions.columns * srcDimensions.rows >= tgtDimensions.rows * srcDimensions.columns:
+                resizeDimensions = Dimensions(columns=tgtDimensions.columns, rows=scaleIntRounded(srcDimensions.rows, tgtDimensions.columns, srcDimensions.columns))
             else:
-                rowMultiplier = 1
-            totalMultiplier = columnMultiplier * rowMultiplier
-            resizeDimensions = Dimensions(int(round(srcDimensions.columns * totalMultiplier)), int(round(srcDimensions.rows * totalMultiplier)))
+                resizeDimensions = Dimensions(columns=scaleIntRounded(srcDimensions.columns, tgtDimensions.rows, srcDimensions.rows), rows=tgtDimensions.rows)
         elif resizeGeom == ResizeGeom.NONE:
             # resizing not enabled - src will be smaller than tgt on one axis
             resizeDimensions = None
@@ -410,8 +534,11 @@ def calcSrcGeomAdjustments(srcDimensions: Dimensions, tgtDimensions: Dimensions,
     #
     # calculate positioning (if an one or more axis is shorter than tgt)
     #
-    pos = Coordinate(x=calcAxisPos(newDimensions.columns, tgtDimensions.columns, horzAlignment),
-        y=calcAxisPos(newDimensions.rows, tgtDimensions.rows, vertAlignment))
+    # src that's equal or larger than target on an axis is positioned at 0 in target
+    amountShortColumns = tgtDimensions.columns - newDimensions.columns
+    amountShortRows = tgtDimensions.rows - newDimensions.rows
+    pos = Coordinate(x=AxisPosFuncs[horzAlignment.value](newDimensions.columns, tgtDimensions.columns, amountShortColumns) if amountShortColumns > 0 else 0,
+        y=AxisPosFuncs[vertAlignment.value](newDimensions.rows, tgtDimensions.rows, amountShortRows) if amountShortRows > 0 else 0)
 
     #
     # calcualte crop
@@ -420,27 +547,29 @@ def calcSrcGeomAdjustments(srcDimensions: Dimensions, tgtDimensions: Dimensions,
         # new dimenions aren't larger than tgt dimensions on any axis, no cropping necessary
         cropRect = None
     else:
-        startx, endx = calcAxisCrop(newDimensions.columns, tgtDimensions.columns, horzAlignment)
-        starty, endy = calcAxisCrop(newDimensions.rows, tgtDimensions.rows, vertAlignment)
+        # an axis that's not larger than tgt needs no cropping
+        startx, endx = AxisCropFuncs[horzAlignment.value](newDimensions.columns, tgtDimensions.columns, -amountShortColumns) if amountShortColumns < 0 else (0, newDimensions.columns)
+        starty, endy = AxisCropFuncs[vertAlignment.value](newDimensions.rows, tgtDimensions.rows, -amountShortRows) if amountShortRows < 0 else (0, newDimensions.rows)
         cropRect = Rect(startx=startx, endx=endx, starty=starty, endy=endy)
 
     srcGeomAdjustments = SrcGeomAdjustments(resizeDimensions=resizeDimensions, posInTgt=pos, cropRect=cropRect)
     return srcGeomAdjustments
 
 
-def execExternalProgram(executableFileName: str, cmdLineArgsList: List[str]) -> subprocess.CompletedProcess:
+def execExternalProgram(executableFileName: str, cmdLineArgsList: List[str], text: bool=True) -> subprocess.CompletedProcess:
 
     """
     Executes an external app, waits for completion
 
     :param executableFileName: Full path to executable
     :param cmdLineArgsList: List structure with command-line arguments
+    :param text: True to capture the app's output as str, False to capture it as bytes
     :return: subprocess.run() return value, or None if error
     """
 
     fullCmdLine = [executableFileName] + cmdLineArgsList
     try:
-        result = subprocess.run(fullCmdLine, check=False, capture_output=True, text=True)
+        result = subprocess.run(fullCmdLine, check=False, capture_output=True, text=text)
         return result
     except FileNotFoundError as e:
         printE(f"execExternalProgram() failed, \"{executableFileName}\" not found")
@@ -450,13 +579,254 @@ def execExternalProgram(executableFileName: str, cmdLineArgsList: List[str]) ->
         return None
 
 
-def extractExifFromNEF(nefFilename: str) -> types.SimpleNamespace:
+def readTiffIfd(data: bytes, endianPrefix: str, tiffBase: int, ifdOffset: int) -> dict:
+
+    """
+    Reads the entries of a TIFF IFD
+
+    :param data: Buffer holding the file contents (bytes or mmap)
+    :param endianPrefix: struct byte order prefix for the IFD ('<' or '>')
+    :param tiffBase: File offset of the TIFF header the IFD's offsets are relative to
+    :param ifdOffset: Offset of the IFD, relative to tiffBase
+    :return: dict of TiffIfdEntry, keyed by tag
+    """
+
+    ifd = dict()
+    ifdStart = tiffBase + ifdOffset
+    countEntries, = struct.unpack_from(endianPrefix + 'H', data, ifdStart)
+    entriesStart = ifdStart + 2
+    entriesData = data[entriesStart : entriesStart + countEntries*12]
+    if len(entriesData) != countEntries*12:
+        raise ValueError(f"IFD at {ifdStart:#x} with {countEntries} entries extends past end of file")
+    entryOffsets = range(entriesStart, entriesStart + countEntries*12, 12)
+    for entryOffset, (tag, fieldType, count, valueOrOffset) in zip(entryOffsets, TiffIfdEntryStructs[endianPrefix].iter_unpack(entriesData)):
+        if count * TiffFieldTypeSizes.get(fieldType, 1) <= 4:
+            # value fits in the entry itself
+            offsetToValue = entryOffset + 8
+        else:
+            offsetToValue = tiffBase + valueOrOffset
+        ifd[tag] = TiffIfdEntry(fieldType=fieldType, count=count, offsetToValue=offsetToValue)
+    return ifd
+
+
+def getTiffIfdEntryValues(data: bytes, endianPrefix: str, entry: TiffIfdEntry) -> Tuple | bytes:
 
     """
-     Extracts useful EXIF info we need from the template NEF
+    Reads the value(s) of a TIFF IFD entry
+
+    :param data: Buffer holding the file contents (bytes or mmap)
+    :param endianPrefix: struct byte order prefix for the IFD ('<' or '>')
+    :param entry: TiffIfdEntry to read
+    :return: Tuple of values for numeric types (rationals are converted to floats), otherwise the raw bytes
+    """
+
+    match entry.fieldType:
+        case 3: # SHORT
+            return struct.unpack_from(f"{endianPrefix}{entry.count}H", data, entry.offsetToValue)
+        case 4 | 13: # LONG, IFD
+            return struct.unpack_from(f"{endianPrefix}{entry.count}I", data, entry.offsetToValue)
+        case 5: # RATIONAL
+            values = struct.unpack_from(f"{endianPrefix}{entry.count*2}I", data, entry.offsetToValue)
+            return tuple(numerator / denominator for numerator, denominator in zip(values[0::2], values[1::2]))
+        case _:
+            return bytes(data[entry.offsetToValue:entry.offsetToValue+entry.count])
+
+
+def extractExifFromNEFNative(nefFilename: str) -> TemplateNefExif:
+
+    """
+    Extracts useful EXIF info we need from the template NEF by walking its TIFF
+    IFDs directly, which avoids the cost of launching exiftool and parsing its
+    verbose output. The IFDs visited are IFD0, its SubIFDs, the Exif IFD, and
+    the Nikon MakerNotes IFD (plus its PreviewIFD)
 
     :param nefFilename: Full path to NEF filename
-    :return: Namespace with EXIF fields, or None if error
+    :return: TemplateNefExif with EXIF fields, or None if error. Raises an exception if
+    the file's structure isn't what we expect, so the caller can fall back to exiftool
+    """
+
+    def embeddedJpgExifInfo(exifName: str, ifd: dict, endianPrefix: str, tiffBase: int) -> EmbeddedJpgExifInfo:
+        # JPEGInterchangeFormat (0x0201) and JPEGInterchangeFormatLength (0x0202)
+        jpgStart = tiffBase + getTiffIfdEntryValues(data, endianPrefix, ifd[0x0201])[0]
+        jpgLength = getTiffIfdEntryValues(data, endianPrefix, ifd[0x0202])[0]
+        return EmbeddedJpgExifInfo(exifName=exifName, start=jpgStart, length=jpgLength, offsetToLengthField=ifd[0x0202].offsetToValue)
+
+    exif = TemplateNefExif()
+
+    with open(nefFilename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+
+        # TIFF header: byte order, magic (42), offset to IFD0
+        match data[0:2]:
+            case b'II':
+                exif.endian = Endian.LITTLE
+                e = '<'
+            case b'MM':
+                exif.endian = Endian.BIG
+                e = '>'
+            case _:
+                raise ValueError("No TIFF byte order mark")
+        magic, ifd0Offset = struct.unpack_from(e + 'HI', data, 2)
+        if magic != 42:
+            raise ValueError("No TIFF magic number")
+
+        ifd0 = readTiffIfd(data, e, 0, ifd0Offset)
+
+        # make sure the file is a Nikon NEF (ie, Make is NIKON and the raw data is in a SubIFD)
+        make = getTiffIfdEntryValues(data, e, ifd0[0x010f]) if 0x010f in ifd0 else b''
+        if not make.startswith(b'NIKON') or 0x014a not in ifd0:
+            printE(f"\"{nefFilename}\" is not a valid Nikon NEF file")
+            return None
+
+        exif.cameraModel = getTiffIfdEntryValues(data, e, ifd0[0x0110]).rstrip(b'\0 ').decode(errors='replace')
+
+        subIFDs = [readTiffIfd(data, e, 0, offset) for offset in getTiffIfdEntryValues(data, e, ifd0[0x014a])]
+        exifIfd = readTiffIfd(data, e, 0, getTiffIfdEntryValues(data, e, ifd0[0x8769])[0])
+
+        #
+        # MakerNotes. Nikon's begin with a "Nikon\0" signature and version, followed
+        # by a complete TIFF header that all the MakerNotes offsets are relative to
+        #
+        makerNotesOffset = exifIfd[0x927c].offsetToValue
+        if data[makerNotesOffset:makerNotesOffset+6] != b'Nikon\0':
+            raise ValueError("MakerNotes don't have a Nikon signature")
+        mnBase = makerNotesOffset + 10
+        mnE = '<' if data[mnBase:mnBase+2] == b'II' else '>'
+        makerNotes = readTiffIfd(data, mnE, mnBase, struct.unpack_from(mnE + 'I', data, mnBase+4)[0])
+
+        #
+        # embedded jpgs, named as exiftool names them. the first SubIFD with a jpg is the
+        # JpgFromRaw, the next is OtherImage. PreviewImage is in the MakerNotes PreviewIFD
+        # and Thumbnail (if present) is in IFD0
+        #
+        embeddedJpgIfds = dict()
+        jpgSubIFDs = [subIFD for subIFD in subIFDs if 0x0201 in subIFD]
+        for exifName, subIFD in zip(["JpgFromRaw", "OtherImage"], jpgSubIFDs):
+            embeddedJpgIfds[exifName] = (subIFD, e, 0)
+        if 0x0011 in makerNotes:
+            previewIfd = readTiffIfd(data, mnE, mnBase, getTiffIfdEntryValues(data, mnE, makerNotes[0x0011])[0])
+            if 0x0201 in previewIfd:
+                embeddedJpgIfds["PreviewImage"] = (previewIfd, mnE, mnBase)
+        if 0x0201 in ifd0:
+            embeddedJpgIfds["Thumbnail"] = (ifd0, e, 0)
+        exif.embeddedJpgs = [embeddedJpgExifInfo(exifName, *embeddedJpgIfds[exifName]) for exifName in EmbeddedJpgExifNames if exifName in embeddedJpgIfds]
+
+        # find the SubIFD with a subfiletype of 0, which is the NEF raw area
+        rawIfd = next(subIFD for subIFD in subIFDs if 0x00fe in subIFD and getTiffIfdEntryValues(data, e, subIFD[0x00fe])[0] == 0)
+
+        exif.rawDimensions = Dimensions(columns=getTiffIfdEntryValues(data, e, rawIfd[0x0100])[0], rows=getTiffIfdEntryValues(data, e, rawIfd[0x0101])[0])
+
+        exif.bitsPerSample = getTiffIfdEntryValues(data, e, rawIfd[0x0102])[0]
+        if exif.bitsPerSample != 14:
+            printE(f'Template NEF "{nefFilename}" is a {exif.bitsPerSample}-bit raw; only 14-bit raws are supported')
+            return None
+
+        exif.stripOffset = getTiffIfdEntryValues(data, e, rawIfd[0x0111])[0]
+        exif.stripByteCount = getTiffIfdEntryValues(data, e, rawIfd[0x0117])[0]
+        exif.fileOffsetToStripByteCount = rawIfd[0x0117].offsetToValue
+
+        # WB_RBLevels (0x000c), rationals. we want the first two (red, blue)
+        wbRBLevels = getTiffIfdEntryValues(data, mnE, makerNotes[0x000c])
+        exif.wbMultipliers = WhiteBalanceMultipliers(wbRBLevels[0], wbRBLevels[1])
+
+        # NEFCompression is its own tag (0x0093) on some models, and at offset 10 of MakerNotes0x51 on others
+        if 0x0093 in makerNotes:
+            exif.nefCompressionType = getTiffIfdEntryValues(data, mnE, makerNotes[0x0093])[0]
+        else:
+            exif.nefCompressionType = struct.unpack_from(mnE + 'H', data, makerNotes[0x0051].offsetToValue + 10)[0]
+        if exif.nefCompressionType != 3:
+            printE(f'Template NEF "{nefFilename}" is not using lossless compression')
+            return None
+
+        if 0x003d in makerNotes:
+            exif.blackLevel = getTiffIfdEntryValues(data, mnE, makerNotes[0x003d])[0]
+        else:
+            # no blacklevel field. Assume it's an older model that subtracted blacks in-camera
+            printV("EXIF: No BlackLevel field found; assuming a black level of zero")
+            exif.blackLevel = 0
+
+        # initial "pred" value for NEF lossless compression is the 16-bit value at offset 2 into the NEFLinearizationTable (0x0096)
+        nefLinearizationTable = getTiffIfdEntryValues(data, mnE, makerNotes[0x0096])
+        exif.predValueNefCompression = int.from_bytes(nefLinearizationTable[2:4], "little" if exif.endian == Endian.LITTLE else "big")
+
+        if 0x0045 in makerNotes:
+            cropArea = getTiffIfdEntryValues(data, mnE, makerNotes[0x0045])
+            exif.cropAreaDimensions = NikonCropArea(left=cropArea[0], top=cropArea[1], columns=cropArea[2], rows=cropArea[3])
+        else:
+            # older models don't have a CropArea tag
+            exif.cropAreaDimensions = None
+
+    return exif
+
+
+def extractExifFromNEF(nefFilename: str) -> TemplateNefExif:
+
+    """
+    Extracts useful EXIF info we need from the template NEF. The NEF's IFDs are
+    read directly, falling back to exiftool if the NEF's structure isn't one we
+    can parse ourselves
+
+    :param nefFilename: Full path to NEF filename
+    :return: TemplateNefExif with EXIF fields, or None if error
+    """
+
+    try:
+        return extractExifFromNEFNative(nefFilename)
+    except (OSError, ValueError, KeyError, IndexError, StopIteration, struct.error) as e:
+        printV(f"EXIF: Unable to parse \"{nefFilename}\" directly ({type(e).__name__}: {e}), falling back to exiftool")
+    return extractExifFromNEFUsingExiftool(nefFilename)
+
+
+@lru_cache(maxsize=16)
+def extractExifFromNEFUsingCache(nefFilename: str, mtimeNs: int, sizeBytes: int) -> TemplateNefExif:
+
+    """
+    Extracts useful EXIF info we need from the template NEF, reusing the info extracted by a previous
+    call in this process (ex: a second run() by createoverlay) if the NEF hasn't changed since. The
+    NEF's modification time and size are part of the cache key for that reason
+
+    :param nefFilename: Full path to NEF filename (absolute)
+    :param mtimeNs: Modification time of NEF, in nanoseconds
+    :param sizeBytes: Size of NEF
+    :return: TemplateNefExif with EXIF fields, or None if error
+    """
+
+    return extractExifFromNEF(nefFilename)
+
+
+def scanExiftoolOutput(exifOutput: bytes) -> dict:
+
+    """
+    Scans exiftool's -v3 output in a single pass, collecting the values of the first
+    occurrence of each field we need within the section of the output it belongs to
+    (see ExiftoolFieldSections)
+
+    :param exifOutput: exiftool -v3 output, undecoded
+    :return: dict of field name -> tuple of the field's values (as str). Fields in
+    ExiftoolMultiInstanceFields are instead a dict of EXIF name -> tuple of remaining values
+    """
+
+    fields = {fieldName: dict() for fieldName in ExiftoolMultiInstanceFields}
+    for m in ExiftoolOutputPattern.finditer(exifOutput):
+        fieldName = m.lastgroup
+        section = ExiftoolFieldSections[fieldName]
+        if section is not None and section not in fields:
+            # we haven't reached the section this field is taken from yet
+            continue
+        values = tuple(value.decode(errors='replace') for value in m.groups() if value is not None)[1:] # drop the outer group, which holds the entire match
+        if fieldName in ExiftoolMultiInstanceFields:
+            fields[fieldName].setdefault(values[0], values[1:])
+        else:
+            fields.setdefault(fieldName, values)
+    return fields
+
+
+def extractExifFromNEFUsingExiftool(nefFilename: str) -> TemplateNefExif:
+
+    """
+     Extracts useful EXIF info we need from the template NEF, by parsing exiftool's verbose output
+
+    :param nefFilename: Full path to NEF filename
+    :return: TemplateNefExif with EXIF fields, or None if error
     """
 
     def reportExifFieldNotFound(fieldName: str) -> None:
@@ -478,13 +848,12 @@ def extractExifFromNEF(nefFilename: str) -> types.SimpleNamespace:
         jpgLengthDescInExif = f"{exifName}Length"             # ex: exifName="JpgFromRaw" -> "JpgFromRawLength"
 
         # extract starting offset to jpg
-        m = re.search(rf'{jpgStartDescInExif} = (\d+)', ifd0Str)
-        if m is None: return None
+        if jpgStartDescInExif not in embeddedJpgStarts: return None
         if exifName != "PreviewImage":
-            jpgStart = int(m.group(1))
+            jpgStart = embeddedJpgStarts[jpgStartDescInExif]
         else:
             # ignore -v3 value and use separate tag value (exiftool bug) for "PreviewImage"
-            jpgStart = exif.PreviewImageStart
+            jpgStart = previewImageStart
 
         '''
         Sample output that we're parsing to get the strip byte count and file offset to strip byte count
@@ -492,70 +861,70 @@ def extractExifFromNEF(nefFilename: str) -> types.SimpleNamespace:
           | |     - Tag 0x0202 (4 bytes, int32u[1]):
           | |        22d68: fd ad 07 00                                     [....]
         '''
-        m = re.search(rf'{jpgLengthDescInExif} = (\d+).*\n.*Tag.*\n.*?([0-9a-f]+):', ifd0Str)
-        if (m is None): return reportExifFieldNotFound(f"{jpgLengthDescInExif}")
-        jpgLength = int(m.group(1))
-        offsetToJpgLengthField = int(m.group(2), 16)
+        if jpgLengthDescInExif not in embeddedJpgLengths: return reportExifFieldNotFound(f"{jpgLengthDescInExif}")
+        (jpgLength, offsetToJpgLengthField) = embeddedJpgLengths[jpgLengthDescInExif]
         return EmbeddedJpgExifInfo(exifName=exifName, start=jpgStart, length=jpgLength, offsetToLengthField=offsetToJpgLengthField)
 
-    exif = types.SimpleNamespace()
+    exif = TemplateNefExif()
 
     # run exiftool in verbose v3 mode
     # note we request the PreviewImageStart tag seperately because the value reported by -v3 isn't corect (https://exiftool.org/forum/index.php?topic=17665.0)
+    # the output is captured whole rather than streamed with an early exit once all our fields are found - exiftool
+    # reports the separately-requested PreviewImageStart only after the entire -v3 dump, so it always runs to the end
     cmdLineArgList = ['-v3', '-PreviewImageStart', nefFilename];
-    result = execExternalProgram("exiftool", cmdLineArgList)
+    result = execExternalProgram("exiftool", cmdLineArgList, text=False)
 
     if result is None:
         printE(f"Failed to execute exiftool on \"{nefFilename}\"")
         return None
     if result.stderr:
-        printE(f"exiftool reported:\n{result.stderr}")
+        printE(f"exiftool reported:\n{result.stderr.decode(errors='replace')}")
         return None
 
-    fullExifStr = result.stdout
+    # scan the exiftool output for all the fields we need in one pass
+    fields = scanExiftoolOutput(result.stdout)
 
     # make sure the file specified is interprted as a valid NEF by exiftool (FileType = NEF)
-    m = re.search(r'FileType = (.+)', fullExifStr)
-    if (m.group(1) != "NEF"):
+    if fields.get('FileType', ("",))[0] != "NEF":
         printE(f"\"{nefFilename}\" is not a valid Nikon NEF file")
         return None
 
     #
-    # parse the exiftool output to extract the fields we need
+    # parse the exiftool fields we need
     #
 
     # extract byte order (ie, endian) of EXIF data
-    m = re.search(r'ExifByteOrder = (.+)', fullExifStr)
-    if m is None: return reportExifFieldNotFound("ExifByteOrder")
-    match m.group(1):
+    if 'ExifByteOrder' not in fields: return reportExifFieldNotFound("ExifByteOrder")
+    match fields['ExifByteOrder'][0]:
         case "II": # "Intel"
             exif.endian = Endian.LITTLE
         case "MM": # "Motorola"
             exif.endian = Endian.BIG
         case _:
-            printE(f"EXIF: Unkown byte order value of \"{m.group(1)}\" for \"{nefFilename}\"")
+            printE(f"EXIF: Unkown byte order value of \"{fields['ExifByteOrder'][0]}\" for \"{nefFilename}\"")
             return None
 
     '''
     Get to IFD0. Sample output that we're parsing:
       + [IFD0 directory with 22 entries]
     '''
-    m = re.search(r'.*\+ \[IFD0 directory', fullExifStr)
-    if m is None: return reportExifFieldNotFound("IFD0")
-    ifd0Str = fullExifStr[m.start():]
+    if 'IFD0' not in fields: return reportExifFieldNotFound("IFD0")
 
     # extract model of camera
-    m = re.search(r'Model = (.+)', ifd0Str)
-    if m is None: return reportExifFieldNotFound("Model")
-    exif.cameraModel = m.group(1)
+    if 'Model' not in fields: return reportExifFieldNotFound("Model")
+    exif.cameraModel = fields['Model'][0]
 
     # obtain PreviewImageStart via the separate tag report because the value reported
     # by -v3 isn't corect (https://exiftool.org/forum/index.php?topic=17665.0)
-    m = re.search(r'Preview Image Start\s+: (.+)', fullExifStr) # sample: "Preview Image Start             : 104744"
-    if m is None: return reportExifFieldNotFound("PreviewImageStart")
-    exif.PreviewImageStart = int(m.group(1))
+    if 'PreviewImageStart' not in fields: return reportExifFieldNotFound("PreviewImageStart")
+    previewImageStart = int(fields['PreviewImageStart'][0])
 
-    # embedded jpgs
+    #
+    # embedded jpgs. the scan kept the first occurrence of each start/length field name, so
+    # look up each embedded jpg's fields by name
+    #
+    embeddedJpgStarts = {exifName: int(values[0]) for (exifName, values) in fields['EmbeddedJpgStart'].items()}
+    embeddedJpgLengths = {exifName: (int(values[0]), int(values[1], 16)) for (exifName, values) in fields['EmbeddedJpgLength'].items()}
     exif.embeddedJpgs = list()
     for embeddedJpgExifName in EmbeddedJpgExifNames:
         e = extractEmbeddedJpgExifInfo(embeddedJpgExifName, "Offset" if embeddedJpgExifName == "Thumbnail" else "Start")
@@ -563,29 +932,23 @@ def extractExifFromNEF(nefFilename: str) -> types.SimpleNamespace:
             exif.embeddedJpgs.append(e)
 
     # find the SubIFD with a subfiletype of 0, which is the NEF raw area
-    m = re.search(r'SubfileType = 0', ifd0Str)
-    if m is None: return reportExifFieldNotFound("SubfileType of 0")
-    subIFDStr = ifd0Str[m.start():]
+    if 'SubfileType0' not in fields: return reportExifFieldNotFound("SubfileType of 0")
 
     # extract ImageWidth and ImageHeight
-    m1 = re.search(r'ImageWidth = (\d+)', subIFDStr)
-    m2 = re.search(r'ImageHeight = (\d+)', subIFDStr)
-    if (m1 is None) or (m2 is None): return reportExifFieldNotFound("ImageWidth/ImageHeight")
-    exif.rawDimensions = Dimensions(columns=int(m1.group(1)), rows=int(m2.group(1)))
+    if ('ImageWidth' not in fields) or ('ImageHeight' not in fields): return reportExifFieldNotFound("ImageWidth/ImageHeight")
+    exif.rawDimensions = Dimensions(columns=int(fields['ImageWidth'][0]), rows=int(fields['ImageHeight'][0]))
 
     # extract BitsPerSample
-    m = re.search(r'BitsPerSample = (\d+)', subIFDStr)
-    if m is None: return reportExifFieldNotFound("BitsPerSample")
-    exif.bitsPerSample = int(m.group(1))
+    if 'BitsPerSample' not in fields: return reportExifFieldNotFound("BitsPerSample")
+    exif.bitsPerSample = int(fields['BitsPerSample'][0])
     if exif.bitsPerSample != 14:
         printE(f'Template NEF "{nefFilename}" is a {exif.bitsPerSample}-bit raw; only 14-bit raws are supported')
         return None
 
 
     # extract StripOffset
-    m = re.search(r'StripOffsets = (\d+)', subIFDStr)
-    if m is None: return reportExifFieldNotFound("StripOffsets")
-    exif.stripOffset = int(m.group(1))
+    if 'StripOffsets' not in fields: return reportExifFieldNotFound("StripOffsets")
+    exif.stripOffset = int(fields['StripOffsets'][0])
 
     '''
     Sample output that we're parsing to get the strip byte count and file offset to strip byte count
@@ -593,36 +956,30 @@ def extractExifFromNEF(nefFilename: str) -> types.SimpleNamespace:
       | |     - Tag 0x0117 (4 bytes, int32u[1]):
       | |        22e02: 6a bd 69 01                                     [j.i.]
     '''
-    m = re.search(r'StripByteCounts = (\d+).*\n.*Tag.*\n.*?([0-9a-f]+):', subIFDStr)
-    if (m is None): return reportExifFieldNotFound("StripByteCounts")
-    exif.stripByteCount = int(m.group(1))
-    exif.fileOffsetToStripByteCount = int(m.group(2), 16)
+    if 'StripByteCounts' not in fields: return reportExifFieldNotFound("StripByteCounts")
+    exif.stripByteCount = int(fields['StripByteCounts'][0])
+    exif.fileOffsetToStripByteCount = int(fields['StripByteCounts'][1], 16)
 
     #
     # move on to Maker Notes
     #
-    m = re.search(r'ExifIFD directory.*MakerNotes directory', ifd0Str, re.DOTALL)
-    if (m is None): return reportExifFieldNotFound("MakerNotes")
-    makerNotesStr = ifd0Str[m.start():]
+    if 'MakerNotes' not in fields: return reportExifFieldNotFound("MakerNotes")
 
     '''
     Sample output that we're parsing to get the Red and Black White Balance multipliers
       | | | 6)  WB_RBLevels = 1.916015625 1.2578125 1 1 (981/512 644/512 512/512 512/512)
     '''
-    m = re.search(r'.*WB_RBLevels = ([\d\.]+) ([\d\.]+)', makerNotesStr)
-    if (m is None): return reportExifFieldNotFound("WB_RBLevels")
-    exif.wbMultipliers = WhiteBalanceMultipliers(float(m.group(1)), float(m.group(2)))
+    if 'WB_RBLevels' not in fields: return reportExifFieldNotFound("WB_RBLevels")
+    exif.wbMultipliers = WhiteBalanceMultipliers(float(fields['WB_RBLevels'][0]), float(fields['WB_RBLevels'][1]))
 
-    m = re.search(r'.*NEFCompression = (\d+)', makerNotesStr)
-    if (m is None): return reportExifFieldNotFound("NEFCompression")
-    exif.nefCompressionType = int(m.group(1))
+    if 'NEFCompression' not in fields: return reportExifFieldNotFound("NEFCompression")
+    exif.nefCompressionType = int(fields['NEFCompression'][0])
     if exif.nefCompressionType != 3:
         printE(f'Template NEF "{nefFilename}" is not using lossless compression')
         return None
 
-    m = re.search(r'.*BlackLevel = (\d+)', makerNotesStr)
-    if m:
-        exif.blackLevel = int(m.group(1))
+    if 'BlackLevel' in fields:
+        exif.blackLevel = int(fields['BlackLevel'][0])
     else:
         # no blacklevel field. Assume it's an older model that subtracted blacks in-camera
         printV("EXIF: No BlackLevel field found; assuming a black level of zero")
@@ -637,21 +994,21 @@ def extractExifFromNEF(nefFilename: str) -> types.SimpleNamespace:
       | | |        19594: e0 72 5e 91 18 f5 1c 99 65 82 f0 af bf 20 d2 d2 [.r^.....e.... ..]
       | | |        195a4: 2f c6 c1 02 a7 86 c5 5a 21 58 d8 a6 ca 36       [/......Z!X...6]
     '''
-    m = re.search(r'.*NEFLinearizationTable .*\n.*Tag.*\n.*?[0-9a-f]+: [0-9a-f][0-9a-f] [0-9a-f][0-9a-f] ([0-9a-f][0-9a-f]) ([0-9a-f][0-9a-f])', makerNotesStr)
-    if (m is None): return reportExifFieldNotFound("NEFLinearizationTable")
+    if 'NEFLinearizationTable' not in fields: return reportExifFieldNotFound("NEFLinearizationTable")
+    predValueBytes = fields['NEFLinearizationTable']
     if exif.endian == Endian.LITTLE:
-        predValueStr = m.group(2)+m.group(1)
+        predValueStr = predValueBytes[1]+predValueBytes[0]
     else:
-        predValueStr = m.group(1)+m.group(2)
+        predValueStr = predValueBytes[0]+predValueBytes[1]
     exif.predValueNefCompression = int(predValueStr, 16)
 
     '''
      Sample output for extracting the initial "CropArea" values
        | | | 35) CropArea = 8 4 6048 4032
     '''
-    m = re.search(r'.*CropArea = (\d+) (\d+) (\d+) (\d+)', makerNotesStr)
-    if m:
-        exif.cropAreaDimensions = NikonCropArea(left=int(m.group(1)), top=int(m.group(2)), columns=int(m.group(3)), rows=int(m.group(4)))
+    if 'CropArea' in fields:
+        cropArea = [int(value) for value in fields['CropArea']]
+        exif.cropAreaDimensions = NikonCropArea(left=cropArea[0], top=cropArea[1], columns=cropArea[2], rows=cropArea[3])
     else:
         # older models don't have a CropArea tag
         exif.cropAreaDimensions = None
@@ -659,20 +1016,37 @@ def extractExifFromNEF(nefFilename: str) -> types.SimpleNamespace:
     return exif
 
 
-def src_EncodeToNikonLossless(bayerImage: np.ndarray[tuple[int, int], np.dtype[np.uint16]]) -> bytearray:
+#
+# python version of the NEF_ENCODE_PARAMS structure in nefencode.c. defined once at module
+# level rather than on each call to src_EncodeToNikonLossless(), since building a ctypes
+# Structure class (and its field descriptors) isn't free
+#
+class NefEncodeParams(ctypes.Structure):
+    _fields_ = [
+        ("countColumns", ctypes.c_int),
+        ("countRows", ctypes.c_int),
+        ("sourceBufferSizeBytes", ctypes.c_int),
+        ("outputBufferSizeBytes", ctypes.c_int),
+        ("startingPredictiveValue", ctypes.c_uint16),
+        ("pad1", ctypes.c_uint16),
+        ("sourceData", ctypes.POINTER(ctypes.c_uint16)),
+        ("outputBuffer", ctypes.POINTER(ctypes.c_uint8)),
+    ]
+
+
+@lru_cache(maxsize=1)
+def loadNefEncodeFunction() -> tuple[Callable, str]:
 
     """
-    Encodes a bayered RGGB image using Nikon's lossless NEF compression, using my optimized 'C' logic
+    Loads the compiled 'C' nefencode shared library and returns its NefEncode() function, with
+    its prototype configured. first we check the base directory of our script, in case the user
+    compiled a version for a non-standard platform. if that doesn't exist then we'll load the
+    pre-compiled version based on the standard platform we're running under. The result is cached,
+    so the library is only located and loaded once per process
 
-    :param bayerImage: Bayered image to encode
-    :return: Encoded data (bytearray)
+    :return: (NefEncode function, None) if successful, (None, error message) if not
     """
 
-    #
-    # load the compiled 'C' shared library. first we check the base directory of our script,
-    # in case the user compiled a version for a non-standard platform. if that doesn't exist
-    # then we'll load the pre-compiled version based on the standard platform we're running under
-    #
     def loadSharedLibrary(path: str):
         try:
             lib = ctypes.CDLL(path)
@@ -688,33 +1062,54 @@ def src_EncodeToNikonLossless(bayerImage: np.ndarray[tuple[int, int], np.dtype[n
         scriptDir = getScriptDir()
         libNefencode, errorMsg = loadSharedLibrary(f"{scriptDir}/{libDir}/nefencode.so")
         if libNefencode is None:
-            printE(errorMsg)
-            return None
+            return (None, errorMsg)
 
-    # define python version of the NEF_ENCODE_PARAMS structure in nefencode.c
-    class NefEncodeParams(ctypes.Structure):
-        _fields_ = [
-            ("countColumns", ctypes.c_int),
-            ("countRows", ctypes.c_int),
-            ("sourceBufferSizeBytes", ctypes.c_int),
-            ("outputBufferSizeBytes", ctypes.c_int),
-            ("startingPredictiveValue", ctypes.c_uint16),
-            ("pad1", ctypes.c_uint16),
-            ("sourceData", ctypes.POINTER(ctypes.c_uint16)),
-            ("outputBuffer", ctypes.POINTER(ctypes.c_uint8)),
-        ]
+    # configure paramters and return value to "t_NefEncodeError NefEncode(NEF_ENCODE_PARAMS *params)"
+    nefEncode = libNefencode.NefEncode
+    nefEncode.argtypes = [ ctypes.POINTER(NefEncodeParams) ]
+    nefEncode.restype = ctypes.c_int32
+    return (nefEncode, None)
 
-    nefEncodeParams = NefEncodeParams()
 
-    # configure paramters and return value to "t_NefEncodeError NefEncode(NEF_ENCODE_PARAMS *params)"
-    libNefencode.NefEncode.argtypes = [ ctypes.POINTER(NefEncodeParams) ]
-    libNefencode.NefEncode.restype = ctypes.c_int32
+@lru_cache(maxsize=1)
+def getEncoderOutputBuffer(sizeBytes: int) -> bytearray:
+
+    """
+    Returns the output buffer for NefEncode(), reusing the buffer from the previous
+    encode when it's the same size (ie, same raw dimensions), which is the case for
+    every encode of a --batch or createoverlay run. NefEncode() doesn't require the
+    buffer to be initialized, plus it returns the length of the data it writes, so
+    stale contents from a previous encode are harmless. The caller must be done with
+    the data of the previous encode before encoding again
+
+    :param sizeBytes: Size of buffer
+    :return: Buffer
+    """
+
+    return bytearray(sizeBytes)
+
+
+def src_EncodeToNikonLossless(bayerImage: np.ndarray[tuple[int, int], np.dtype[np.uint16]]) -> memoryview:
+
+    """
+    Encodes a bayered RGGB image using Nikon's lossless NEF compression, using my optimized 'C' logic
+
+    :param bayerImage: Bayered image to encode
+    :return: Encoded data (memoryview into the encoder's output buffer)
+    """
+
+    nefEncode, errorMsg = loadNefEncodeFunction()
+    if nefEncode is None:
+        printE(errorMsg)
+        return None
+
+    nefEncodeParams = NefEncodeParams()
 
     # build NefEncodeParams
 
     sourceImageSizeBytes = bayerImage.nbytes
     outputBufferSizeBytes = sourceImageSizeBytes + 1048576 # +1MB is somewhat arbitrary
-    outputBuffer = bytearray(outputBufferSizeBytes)
+    outputBuffer = getEncoderOutputBuffer(outputBufferSizeBytes)
     outputBufferCtypeArray = (ctypes.c_uint8 * outputBufferSizeBytes)
 
     nefEncodeParams.countColumns = Config.exif.rawDimensions.columns
@@ -729,13 +1124,14 @@ def src_EncodeToNikonLossless(bayerImage: np.ndarray[tuple[int, int], np.dtype[n
     assert bayerImage.flags['C_CONTIGUOUS'] == True, "Image numpy array isn't contiguous!"
 
     # call nefencode.c::NefEncode() in shared library to encode the data
-    result = libNefencode.NefEncode(ctypes.byref(nefEncodeParams))
+    result = nefEncode(ctypes.byref(nefEncodeParams))
 
     if result < 0:
         printE(f"Compressing image data into Nikon lossless failed - error={result}")
         return None
 
-    return outputBuffer[:result]
+    # return a view of the encoded portion of the output buffer rather than a slice, which would copy it
+    return memoryview(outputBuffer)[:result]
 
 
 def splitPathIntoParts(fullPath: str) -> tuple[str, str, str]:
@@ -783,15 +1179,30 @@ def generateUniqueFilenameFromExistingIfNecessary(fullPath: str) -> str:
     fullPath with a unique suffix
     """
 
+    if not os.path.exists(fullPath):
+        return fullPath # first candidate is without a suffix
+
+    #
+    # list the directory once rather than checking each suffixed candidate for existence, since
+    # a directory accumulating outputs would otherwise take a check per previously-used suffix.
+    # names are compared case-insensitively so a case-insensitive filesystem can't produce a false
+    # "doesn't exist", and the chosen candidate is still checked in case it was created meanwhile
+    #
     dir, root, ext = splitPathIntoParts(fullPath)
+    try:
+        with os.scandir(dir or os.curdir) as dirEntries:
+            existingFilenames = {dirEntry.name.casefold() for dirEntry in dirEntries}
+    except OSError:
+        existingFilenames = set()
 
-    seqNum = 0; seqNumStr = "" # first candidate is without a suffix
+    seqNum = 1
     while True:
-        filenameCandidate = os.path.join(dir, root + seqNumStr + ext)
-        if not os.path.exists(filenameCandidate):
-            return filenameCandidate
+        candidateFilename = f"{root}-{seqNum}{ext}"
+        if candidateFilename.casefold() not in existingFilenames:
+            filenameCandidate = os.path.join(dir, candidateFilename)
+            if not os.path.exists(filenameCandidate):
+                return filenameCandidate
         seqNum += 1
-        seqNumStr = f"-{seqNum}"
 
 
 def generateOutputFilename() -> str:
@@ -838,6 +1249,42 @@ def generateOutputFilename() -> str:
     return outputFilename
 
 
+def getJpgDimensions(jpgData: bytes) -> Dimensions:
+
+    """
+    Determines the dimensions of a jpg from its start-of-frame (SOF) segment, walking
+    the segments that precede it by their lengths rather than decoding the image
+
+    :param jpgData: In-memory jpg
+    :return: Dimensions of jpg, or None if a SOF segment couldn't be found
+    """
+
+    if jpgData[0:2] != b'\xff\xd8':
+        return None # not a jpg (no SOI marker)
+    offset = 2
+    while offset + 4 <= len(jpgData):
+        if jpgData[offset] != 0xFF:
+            return None # not at a marker - the jpg is malformed
+        marker = jpgData[offset+1]
+        if marker == 0xFF:
+            offset += 1 # fill byte preceding the marker
+            continue
+        if marker in JpgStandaloneMarkers:
+            offset += 2
+            continue
+        if marker in JpgSofMarkers:
+            # SOF payload: length (16 bits), precision (8 bits), rows (16 bits), columns (16 bits)
+            if offset + 9 > len(jpgData):
+                return None
+            (rows, columns) = struct.unpack_from('>HH', jpgData, offset+5)
+            return Dimensions(rows=rows, columns=columns)
+        if marker == 0xDA:
+            return None # start of scan reached without a SOF
+        (segmentLength,) = struct.unpack_from('>H', jpgData, offset+2)
+        offset += 2 + segmentLength
+    return None
+
+
 def generateEmbeddedJpg(image: np.ndarray, embeddedJpgDimensions: Dimensions, maxSizeBytes: int, embeddedJpgExifName: str) -> np.ndarray:
 
     """
@@ -857,24 +1304,54 @@ def generateEmbeddedJpg(image: np.ndarray, embeddedJpgDimensions: Dimensions, ma
         image = cv2.resize(image, (embeddedJpgDimensions.columns, embeddedJpgDimensions.rows), interpolation=Config.args.re_algorithm)
 
     #
-    # use PIL to generate the embedded jpg from he source data. We use PIL instead of cv2
-    # because cv2 doesn't support 4:2:2 encoding and Nikon cameras require 4:2:2 for their
-    # in-camera playback functionality
+    # generate the embedded jpg from the source data, which is in cv2's BGR order. Nikon cameras
+    # require 4:2:2 encoding for their in-camera playback functionality, which cv2 supports as of
+    # 4.5.5 (IMWRITE_JPEG_SAMPLING_FACTOR). cv2 encodes the BGR data directly; for older versions of
+    # cv2 we fall back to PIL, which needs the data in RGB order. both jpeg encoders are built on
+    # libjpeg-turbo, so the encodes run through its SIMD paths without needing a separate turbojpeg binding
     #
-    pilImage = Image.fromarray(image)
-    quality = 100
-    while True:
-        memoryFile = BytesIO()
-        pilImage.save(memoryFile, format='JPEG', subsampling='4:2:2', quality=quality)
-        jpg = memoryFile.getvalue()
-        jpgSizeBytes = len(jpg)
-        printD(f"Generated embedded jpg \"{embeddedJpgExifName}\" (qual={quality}): {jpgSizeBytes:,} bytes vs max fit {maxSizeBytes:,} bytes")
-        if jpgSizeBytes <= maxSizeBytes:
-            return jpg
-        if quality <= 20: # minimum quality we attempt is 20 (arbitrary)
-            break;
-        quality -= 10
-    printW(f"Unable to generate embedded jpg \"{embeddedJpgExifName}\" that fits within {maxSizeBytes:,} bytes - last attempt produced {jpgSizeBytes:,} bytes at a quality level of {quality}")
+    if hasattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR'):
+        def encodeJpgData(quality: int) -> bytes:
+            _, jpgData = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality,
+                cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422])
+            return jpgData.tobytes()
+    else:
+        pilImage = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        def encodeJpgData(quality: int) -> bytes:
+            memoryFile = BytesIO()
+            pilImage.save(memoryFile, format='JPEG', subsampling='4:2:2', quality=quality)
+            return memoryFile.getvalue()
+
+    def encodeJpg(quality: int) -> bytes:
+        jpg = encodeJpgData(quality)
+        printD(f"Generated embedded jpg \"{embeddedJpgExifName}\" (qual={quality}): {len(jpg):,} bytes vs max fit {maxSizeBytes:,} bytes")
+        return jpg
+
+    # full quality usually fits, so try it first
+    jpg = encodeJpg(100)
+    if len(jpg) <= maxSizeBytes:
+        return jpg
+
+    #
+    # find the highest quality of 90, 80, ... 20 whose jpg fits. the size of a jpg grows with
+    # its quality, so we bisect the quality levels rather than trying each one in turn, which
+    # takes at most 4 encodes instead of 8. the minimum quality we attempt is 20 (arbitrary)
+    #
+    qualities = range(20, 100, 10)
+    bestJpg = None
+    low, high = 0, len(qualities)-1
+    while low <= high:
+        mid = (low + high) // 2
+        jpg = encodeJpg(qualities[mid])
+        if len(jpg) <= maxSizeBytes:
+            bestJpg = jpg
+            low = mid + 1
+        else:
+            high = mid - 1
+    if bestJpg is not None:
+        return bestJpg
+    # nothing fit, in which case the last attempt was at the minimum quality
+    printW(f"Unable to generate embedded jpg \"{embeddedJpgExifName}\" that fits within {maxSizeBytes:,} bytes - last attempt produced {len(jpg):,} bytes at a quality level of {qualities[0]}")
     return None
 
 
@@ -900,24 +1377,26 @@ def generatePlaceholderEmbeddedJpg(embeddedJpgDimensions: Dimensions, maxSizeByt
     text = f"{embeddedJpgExifName}, {embeddedJpgDimensions.columns} x {embeddedJpgDimensions.rows}"
 
     #
-    # iterate through font sizes until we find one that allows our single line of text
-    # to fill out the horizontal axis entirely
+    # find the font size that allows our single line of text to fill out the horizontal axis
+    # entirely. the width of the text scales ~linearly with the font size, so we measure it once
+    # at a reference size and scale from that, then step down in case the scaled size is a bit
+    # too wide (rounding of the glyph metrics)
     #
     centerX = embeddedJpgDimensions.columns/2
     centerY = embeddedJpgDimensions.rows/2
-    fontSize = 512
-    while fontSize >= 8:
-        defaultFont = ImageFont.load_default(size=fontSize)
-        left, top, right, bottom = draw.textbbox((centerX, centerY), text, font=defaultFont, anchor="mm")
-        textWidthPixels = int(right-left)
-        if textWidthPixels < embeddedJpgDimensions.columns:
-            # found a good font size
-            break
-        multiple  = textWidthPixels // embeddedJpgDimensions.columns
-        if multiple >= 2:
-            fontSize //= multiple
-        else:
-            fontSize = int(math.floor(fontSize * .95))
+
+    def measureTextWidth(fontSize: int) -> tuple[ImageFont.FreeTypeFont, int]:
+        font = ImageFont.load_default(size=fontSize)
+        left, top, right, bottom = draw.textbbox((centerX, centerY), text, font=font, anchor="mm")
+        return (font, int(right-left))
+
+    referenceFontSize = 64
+    _, referenceTextWidthPixels = measureTextWidth(referenceFontSize)
+    fontSize = max(8, min(512, referenceFontSize * embeddedJpgDimensions.columns // max(referenceTextWidthPixels, 1)))
+    defaultFont, textWidthPixels = measureTextWidth(fontSize)
+    while textWidthPixels >= embeddedJpgDimensions.columns and fontSize > 8:
+        fontSize = max(8, int(math.floor(fontSize * .95)))
+        defaultFont, textWidthPixels = measureTextWidth(fontSize)
     draw.text((centerX,centerY), text, color="white", font=defaultFont, anchor="mm")
 
     #
@@ -936,13 +1415,13 @@ def generatePlaceholderEmbeddedJpg(embeddedJpgDimensions: Dimensions, maxSizeByt
     return jpg
 
 
-def generateAndInsertEmbeddedJpgs(image: np.ndarray, newNefData: bytearray) -> bool:
+def generateAndInsertEmbeddedJpgs(image: np.ndarray, newNefData: mmap.mmap) -> bool:
 
     """
     Geneates and inserts (overwrites) embedded JPGs into NEF data in memory
 
     :param image: Fully-processed source image to use as embedded jpg, or None if not available
-    :param newNefData: Bytearray containing entire template NEF, minus the raw data
+    :param newNefData: Writable (copy-on-write) mapping of the template NEF, minus the raw data
     :return: False if successful, True if error
     """
 
@@ -965,9 +1444,9 @@ def generateAndInsertEmbeddedJpgs(image: np.ndarray, newNefData: bytearray) -> b
     def getEmbeddedJpgDimensions(exifFieldName: str, origJpgStart: int, origJpgSize: int):
 
         """
-        Determines dimensions of existing embedded JPG by telling CV2 to decode our in-memory copy of the
-        jpg. We have to do this because Nikon doesn't provide the dimensions of the embedded jpgs in a
-        separate EXIF field.
+        Determines dimensions of existing embedded JPG by parsing the SOF segment of our in-memory copy
+        of the jpg. We have to do this because Nikon doesn't provide the dimensions of the embedded jpgs
+        in a separate EXIF field.
 
         :param exifFieldName: EXIF field name for embedded jpg
         :param origJpgStart: Offset to embedded jpg in template NEF
@@ -975,12 +1454,10 @@ def generateAndInsertEmbeddedJpgs(image: np.ndarray, newNefData: bytearray) -> b
         :return: Dimensions of embedded jpg
         """
 
-        jpgData = np.frombuffer(newNefData[origJpgStart : origJpgStart + origJpgSize], dtype=np.uint8)
-        jpgFromData = cv2.imdecode(jpgData, cv2.IMREAD_UNCHANGED)
-        if jpgFromData is None:
-            printE(f"Unable to decode embedded jpg \"{exifFieldName}\"")
-            return None
-        return Dimensions(rows=jpgFromData.shape[0], columns=jpgFromData.shape[1])
+        dimensions = getJpgDimensions(newNefData[origJpgStart : origJpgStart + origJpgSize])
+        if dimensions is None:
+            printE(f"Unable to parse dimensions of embedded jpg \"{exifFieldName}\"")
+        return dimensions
 
 
     #
@@ -991,11 +1468,11 @@ def generateAndInsertEmbeddedJpgs(image: np.ndarray, newNefData: bytearray) -> b
         image = loadImageToUseAsEmbeddedJpg(Config.args.embeddedimg)
     if image is not None:
         #
-        # convert the image to 8-bit RGB, then crop using Nikon's crop field in EXIF. This
-        # image will serve as the source for all the embedded JPGs.
+        # convert the image to 8-bit, then crop using Nikon's crop field in EXIF. This image
+        # will serve as the source for all the embedded JPGs. it's left in BGR order, which
+        # generateEmbeddedJpg() encodes from
         #
         _, image8 = convertImageNumpyTypeIfNecessary(image, "uint8")
-        image8 = cv2.cvtColor(image8, cv2.COLOR_BGR2RGB)
         if Config.exif.cropAreaDimensions:
             cropRect = Rect(startx = Config.exif.cropAreaDimensions.left,
                 endx = Config.exif.cropAreaDimensions.left + Config.exif.cropAreaDimensions.columns,
@@ -1007,20 +1484,19 @@ def generateAndInsertEmbeddedJpgs(image: np.ndarray, newNefData: bytearray) -> b
         printW("No image available for embedded jpgs - will generate a placeholder image")
         image8 = None
 
-    #
-    # generate and insert each of the embedded JPGs
-    #
-    for embeddedJpgExif in Config.exif.embeddedJpgs:
+    def generateEmbeddedJpgForExif(embeddedJpgExif: EmbeddedJpgExifInfo) -> tuple[bool, bytes]:
 
-        # get parameters of the embedded jpg
-        jpgExifName = embeddedJpgExif.exifName
-        origJpgStart = embeddedJpgExif.start
-        origJpgSize = embeddedJpgExif.length
-        offsetToOrigJpgSizeInTemplateNef = embeddedJpgExif.offsetToLengthField
+        """
+        Generates the new jpg for one of the template NEF's embedded jpgs. Run on
+        a worker thread, so it only reads newNefData
+
+        :param embeddedJpgExif: EXIF info of the template NEF's embedded jpg
+        :return: (fError, jpg). jpg is None if one couldn't be generated within the size constraint
+        """
 
-        dimensions = getEmbeddedJpgDimensions(jpgExifName, origJpgStart, origJpgSize)
+        dimensions = getEmbeddedJpgDimensions(embeddedJpgExif.exifName, embeddedJpgExif.start, embeddedJpgExif.length)
         if dimensions is None:
-            return True
+            return (True, None)
 
         #
         # generate a new embedded jpg of the same dimensions, restricting its size to the
@@ -1028,12 +1504,34 @@ def generateAndInsertEmbeddedJpgs(image: np.ndarray, newNefData: bytearray) -> b
         # exif fields to make room for larger jpgs
         #
         if image8 is not None:
-            embeddedJpg = generateEmbeddedJpg(image8, dimensions, origJpgSize, jpgExifName)
+            embeddedJpg = generateEmbeddedJpg(image8, dimensions, embeddedJpgExif.length, embeddedJpgExif.exifName)
         else:
             embeddedJpg = None
         if embeddedJpg is None:
             # failed to fit an embedded image or none was available - try a placeholder image
-            embeddedJpg = generatePlaceholderEmbeddedJpg(dimensions, origJpgSize, jpgExifName)
+            embeddedJpg = generatePlaceholderEmbeddedJpg(dimensions, embeddedJpgExif.length, embeddedJpgExif.exifName)
+        return (False, embeddedJpg)
+
+    #
+    # generate each of the embedded JPGs. they're independent of each other and cv2/PIL release the GIL
+    # while resizing/encoding, so they're generated in parallel on worker threads
+    #
+    with ThreadPoolExecutor(max_workers=len(Config.exif.embeddedJpgs) or 1) as executor:
+        generatedJpgs = list(executor.map(generateEmbeddedJpgForExif, Config.exif.embeddedJpgs))
+
+    #
+    # insert each of the embedded JPGs. done serially here since the inserts modify newNefData
+    #
+    for embeddedJpgExif, (fError, embeddedJpg) in zip(Config.exif.embeddedJpgs, generatedJpgs):
+
+        if fError:
+            return True
+
+        # get parameters of the embedded jpg
+        jpgExifName = embeddedJpgExif.exifName
+        origJpgStart = embeddedJpgExif.start
+        origJpgSize = embeddedJpgExif.length
+        offsetToOrigJpgSizeInTemplateNef = embeddedJpgExif.offsetToLengthField
 
         #
         # insert (overwrite) new jpg in memory. if we couldn't generate the jpg due to size
@@ -1046,70 +1544,68 @@ def generateAndInsertEmbeddedJpgs(image: np.ndarray, newNefData: bytearray) -> b
             newNefData[origJpgStart : origJpgStart + newJpgSizeBytes] = embeddedJpg
             # if new jpg is smaller than existing, fill unused portion with zeros (not necessary but for debug clarity)
             if (countUnusedBytes := origJpgSize-newJpgSizeBytes) > 0:
-                newNefData[origJpgStart+newJpgSizeBytes : origJpgStart+origJpgSize] = bytes([0x0] * countUnusedBytes)
+                newNefData[origJpgStart+newJpgSizeBytes : origJpgStart+origJpgSize] = bytes(countUnusedBytes)
             # update EXIF size field
-            newNefData[offsetToOrigJpgSizeInTemplateNef : offsetToOrigJpgSizeInTemplateNef+4] = struct.pack('<I', newJpgSizeBytes)
+            struct.pack_into('<I', newNefData, offsetToOrigJpgSizeInTemplateNef, newJpgSizeBytes)
 
     return False
 
 
-def writeOutputNEF(image: np.ndarray, encodedImageData: bytearray) -> bool:
+def writeOutputNEF(image: np.ndarray, getEncodedImageData: Callable[[], memoryview]) -> bool:
 
     """
     Writes losslessly-encoded image data into a Nikon NEF raw file
 
     :param image: Fully-processed source image (or None if not available)
-    :param encodedImageData: Encoded image data (bytearray)
+    :param getEncodedImageData: Returns the encoded image data, or None if the encoding failed. Not called until
+    the embedded jpgs have been generated, so that the encoding can run concurrently with their generation
     :return: False if successful, TRUE if error
     """
 
     #
-    # read entire template NEF up to where the raw data starts but not the raw data itself,
-    # since we'l be replacing that with the new raw data we've generated
+    # map the template NEF up to where the raw data starts but not the raw data itself, since
+    # we'l be replacing that with the new raw data we've generated. the mapping is copy-on-write,
+    # so our edits are made in place in memory without modifying the template NEF itself
     #
-    encodedImageDataSize = len(encodedImageData)
     templateNefSizeExcludingRawData = Config.exif.stripOffset
     try:
         with open(Config.args.templatenef, 'rb') as f:
-            templateNefData = f.read(templateNefSizeExcludingRawData)
+            newNefData = mmap.mmap(f.fileno(), templateNefSizeExcludingRawData, access=mmap.ACCESS_COPY)
     except Exception as e:
         printE(f"Unable to open/read template NEF \"{Config.args.templatenef}\", error: {e}")
         return True
 
-    # create mutable buffer we'll use to hold template NEF data and the data we're merging into it
-    newNefData = bytearray(templateNefSizeExcludingRawData + encodedImageDataSize)
+    with newNefData:
 
-    # copy data from template NEF up to where the raw data starts
-    newNefData[0:templateNefSizeExcludingRawData] = templateNefData
+        #
+        # generate+insert embedded JPGs. We ignore errors for this because the embedded jpgs aren't essential
+        #
+        generateAndInsertEmbeddedJpgs(image, newNefData)
 
-    #
-    # copy the raw data we encoded (compressed), which inludates updating the 32-bit strip count
-    # field that reflects the size of our encoded data
-    #
-    newNefData[templateNefSizeExcludingRawData:] = encodedImageData
-    newNefData[Config.exif.fileOffsetToStripByteCount:Config.exif.fileOffsetToStripByteCount+4] = struct.pack('<I', encodedImageDataSize)
+        encodedImageData = getEncodedImageData()
+        if encodedImageData is None:
+            return True
 
-    #
-    # generate+insert embedded JPGs. We ignore errors for this because the embedded jpgs aren't essential
-    #
-    generateAndInsertEmbeddedJpgs(image, newNefData)
+        # update the 32-bit strip count field to reflect the size of our encoded (compressed) raw data
+        struct.pack_into('<I', newNefData, Config.exif.fileOffsetToStripByteCount, len(encodedImageData))
 
-    #
-    # determine the output filename
-    #
-    outputFilename = generateOutputFilename()
-    if not outputFilename:
-        return True
+        #
+        # determine the output filename
+        #
+        outputFilename = generateOutputFilename()
+        if not outputFilename:
+            return True
 
-    #
-    # write out the NEF
-    #
-    try:
-        with open(outputFilename, 'wb') as f:
-            f.write(newNefData)
-    except Exception as e:
-        printE(f"Unable to create/write output NEF \"{outputFilename}\", error: {e}")
-        return True
+        #
+        # write out the NEF - the template NEF data up to where the raw data starts, followed by our encoded raw data
+        #
+        try:
+            with open(outputFilename, 'wb') as f:
+                f.write(newNefData)
+                f.write(encodedImageData)
+        except Exception as e:
+            printE(f"Unable to create/write output NEF \"{outputFilename}\", error: {e}")
+            return True
 
     printI(f"Successfully generated \"{os.path.realpath(outputFilename)}\"")
     if Config.args.openinviewer:
@@ -1158,13 +1654,39 @@ def src_ConvertNormalizedFloatTo16Bit(image: np.ndarray) -> np.ndarray:
     return (origType != image.dtype, image)
 
 
-def resizeImgToRawDimensions(image: np.ndarray, desc: str) -> np.ndarray:
+def resizeImage(image: np.ndarray, dimensions: Dimensions) -> np.ndarray:
+
+    """
+    Resizes an image using the user's configured algorithm. If --re.opencl is
+    enabled, OpenCL is available, and the resize is large enough to be worth
+    the copies to/from the device, the resize is done via a cv2.UMat, which lets
+    cv2 dispatch it to the GPU. cv2 transparently falls back to its CPU
+    implementation for any resize its OpenCL path doesn't support.
+
+    :param image: Image to resize
+    :param dimensions: Dimensions to resize to
+    :return: Resized image
+    """
+
+    dsize = (dimensions.columns, dimensions.rows)
+    if Config.args.re_opencl and (image.shape[0] * image.shape[1] * dimensions.columns * dimensions.rows > ResizeOpenCLMinPixelProduct):
+        if cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL():
+            printV(f"Resize: Using OpenCL to resize {image.shape[1]}x{image.shape[0]} -> {dimensions.columns}x{dimensions.rows}")
+            return cv2.resize(cv2.UMat(image), dsize, interpolation=Config.args.re_algorithm).get()
+        printV("Resize: OpenCL isn't available, resizing on the CPU instead")
+    return cv2.resize(image, dsize, interpolation=Config.args.re_algorithm)
+
+
+def resizeImgToRawDimensions(image: np.ndarray, desc: str, interpolationTypeWanted: Type[type]=None) -> np.ndarray:
 
     """
     Resizes image based on user's configuration
 
     :param image: Image to resize
     :param desc: Description of image, to be used in debug prints
+    :param interpolationTypeWanted: If specified, numpy type to convert the image to before it's resized (interpolated),
+    so that the interpolated values can keep more precision than the image's type has. Crops and borders don't
+    interpolate, so an image that only needs those is left in its original type
     :return: (bool, image) True with new if image was generated, False with original image otherwise
     """
 
@@ -1179,7 +1701,9 @@ def resizeImgToRawDimensions(image: np.ndarray, desc: str) -> np.ndarray:
         # nothing to do
         return (False, image)
     if srcGeomAdjustments.resizeDimensions:
-        image = image = cv2.resize(image, (srcGeomAdjustments.resizeDimensions.columns, srcGeomAdjustments.resizeDimensions.rows), interpolation=Config.args.re_algorithm)
+        if interpolationTypeWanted:
+            origType, image = convertImageNumpyTypeIfNecessary(image, interpolationTypeWanted)
+        image = resizeImage(image, srcGeomAdjustments.resizeDimensions)
     if srcGeomAdjustments.cropRect:
         image = image[srcGeomAdjustments.cropRect.starty:srcGeomAdjustments.cropRect.endy, srcGeomAdjustments.cropRect.startx:srcGeomAdjustments.cropRect.endx]
 
@@ -1190,9 +1714,16 @@ def resizeImgToRawDimensions(image: np.ndarray, desc: str) -> np.ndarray:
         countBorderRowsBelow = outputDimensions.rows - (newSrcDimensions.rows + srcGeomAdjustments.posInTgt.y)
         countBorderRowsLeft = srcGeomAdjustments.posInTgt.x
         countBorderRowsRight =  outputDimensions.columns - (newSrcDimensions.columns + srcGeomAdjustments.posInTgt.x)
-        # RGB values below are multiplied by 256 to scale them from 8-bit to 16-bit
+        # the 8-bit RGB values of the border color are scaled to the bit depth of integer images (ex: by 256 for 16-bit),
+        # the same way convertImageNumpyTypeIfNecessary() scales 8-bit images to deeper integer types. float images
+        # are normalized to 0.0..1.0, so their border color is too
+        if np.issubdtype(image.dtype, np.integer):
+            borderColorShift = (image.dtype.itemsize - 1) * 8
+            borderColor = tuple(channelValue << borderColorShift for channelValue in Config.args.re_borderfillcolor)
+        else:
+            borderColor = tuple(channelValue / 255 for channelValue in Config.args.re_borderfillcolor)
         image = cv2.copyMakeBorder(image, countBorderRowsAbove, countBorderRowsBelow, countBorderRowsLeft, countBorderRowsRight,
-            cv2.BORDER_CONSTANT, value=((  ((Config.args.re_borderfillcolor & 0xff)*256), ((Config.args.re_borderfillcolor>>8 & 0xff)*256), ((Config.args.re_borderfillcolor>>16 & 0xff)*256))))
+            cv2.BORDER_CONSTANT, value=borderColor)
 
     finalSrcDimensions = Dimensions(rows=image.shape[0], columns=image.shape[1])
     assert finalSrcDimensions == outputDimensions, f"src_Resize: Internal error, {desc} resized from {origSrcDimensions} to {finalSrcDimensions} but raw is {outputDimensions}"
@@ -1209,16 +1740,19 @@ def src_Resize(image: np.ndarray) -> np.ndarray:
     :return: (bool, image) True with new if image was generated, False with original image otherwise
     """
 
-    return resizeImgToRawDimensions(image, "source")
+    # 8-bit sources are interpolated at 16 bits, for the precision of the values in between source pixels
+    return resizeImgToRawDimensions(image, "source", "uint16")
 
 
 
-def src_ConvertToBayer(image: np.ndarray) -> np.ndarray:
+def src_ConvertToBayer(image: np.ndarray, out: np.ndarray=None) -> np.ndarray:
 
     """
     Converts RGB image to either bayer RGGB image or grayscale, depending on source image and user configuration
 
     :param image: Image to convert
+    :param out: If specified, 2D array (rows x columns) of the image's type to write the converted image into, rather
+    than allocating a new one
     :return: (bool, image) True with new if image was generated, False with original image otherwise
     """
 
@@ -1231,7 +1765,7 @@ def src_ConvertToBayer(image: np.ndarray) -> np.ndarray:
         :return: bAYER IMAGE
         """
         dimensions = Dimensions(rows=image.shape[0], columns=image.shape[1])
-        bayer = np.empty((dimensions.rows, dimensions.columns), dtype=image.dtype)
+        bayer = out if out is not None else np.empty((dimensions.rows, dimensions.columns), dtype=image.dtype)
         bayer[0::2,0::2] = image[0::2,0::2,2] # RGGB Red  = BGR Red
         bayer[0::2,1::2] = image[0::2,1::2,1] # RGGB G1   = BGR Green
         bayer[1::2,0::2] = image[1::2,0::2,1] # RGGB G2   = BGR Green
@@ -1245,7 +1779,7 @@ def src_ConvertToBayer(image: np.ndarray) -> np.ndarray:
         return (False, image)
 
     if Config.args.src_grayscale:
-        image = cv2.cvtColor(image, cv2.COLOR_3GRAY)
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=out)
     else:
         image = colorToBayer(image)
 
@@ -1282,14 +1816,14 @@ def convertImageNumpyTypeIfNecessary(image: np.ndarray, typeWanted: Type[type])
         image = image.astype(typeWanted)
     elif np.issubdtype(origType, np.integer) and np.issubdtype(typeWanted, np.integer):
         # going from one integer type to another integer type
+        # the shift produces the new type directly, converting and scaling in a single pass
         if origType.itemsize <= typeWanted.itemsize:
             # increasing bit-depth - scale values up
-            image = image.astype(typeWanted)
-            image <<= ((typeWanted.itemsize - origType.itemsize) * 8)
+            image = np.left_shift(image, (typeWanted.itemsize - origType.itemsize) * 8, dtype=typeWanted)
         else:
-            # decreasing bit-depth - scale values down
-            image >>= ((origType.itemsize - typeWanted.itemsize) * 8)
-            image = image.astype(typeWanted)
+            # decreasing bit-depth - scale values down. this also leaves the original image unmodified
+            image = np.right_shift(image, (origType.itemsize - typeWanted.itemsize) * 8,
+                out=np.empty(image.shape, dtype=typeWanted), casting='unsafe')
     else:
         # float to another float type - no scaling necessary
         image = image.astype(typeWanted)
@@ -1308,29 +1842,71 @@ def src_ModifyHSL(image: np.ndarray) -> np.ndarray:
     if Config.args.src_hsl is None:
         return (False, image)
     assert np.issubdtype(image.dtype, np.floating), f"src_ModifyHSL: expecting image data type to be floating-point but encountered \"{image.dtype}\""
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    if image.ndim == 2:
+        # grayscale image. it has no hue or saturation, and its lightness (HSV value) is the pixel value itself
+        image *= Config.args.src_hsl[2]
+        return (True, image)
+    # the conversions are done in place, since the image is always a float copy made for the float operations and
+    # cv2 converts each pixel independently. this avoids allocating a full-size float image for each conversion
+    cv2.cvtColor(image, cv2.COLOR_BGR2HSV, dst=image)
     image *= Config.args.src_hsl
-    image = cv2.cvtColor(image, cv2.COLOR_HSV2BGR)
+    cv2.cvtColor(image, cv2.COLOR_HSV2BGR, dst=image)
 
     return (True, image)
 
 
+def convertSRGBToLinear(image: np.ndarray) -> np.ndarray:
+
+    """
+    Converts normalized float sRGB values to linear
+
+    :param image: sRGB image to convert (float, normalized to 0.0 to 1.0)
+    :return: Linear image (float, normalized to 0.0 to 1.0)
+    """
+
+    # each branch of the conversion is computed only on the values it applies to, rather than computing
+    # both for every value and selecting between them, so the raised power isn't done on the linear segment
+    linear = np.empty_like(image)
+    fLinearSegment = (image <= 0.04045)
+    linear[fLinearSegment] = image[fLinearSegment] / 12.92
+    fPowerSegment = ~fLinearSegment
+    linear[fPowerSegment] = ((image[fPowerSegment] + 0.055) / 1.055)**2.4
+    return linear
+
+
+@lru_cache(maxsize=1)
+def getSRGBToLinearLUT() -> np.ndarray:
+
+    """
+    Builds the lookup table to convert 16-bit sRGB values to normalized float linear values. The
+    table is generated with the same conversions done on a per-pixel basis, so a lookup produces
+    the identical value without the per-pixel raised-power logic
+
+    :return: 65536-entry LUT, indexed by 16-bit sRGB value
+    """
+
+    printV("sRGB to linear: using lookup table for 16-bit values")
+    origType, lut = convertImageNumpyTypeIfNecessary(np.arange(65536, dtype=np.uint16), ImgFloatType)
+    return convertSRGBToLinear(lut)
+
+
 def src_ConvertSRGBToLinear(image: np.ndarray) -> np.ndarray:
 
     """
     Converts image from sRGB to Linear RGB
 
-    :param image: sRGB bayeredimage to convert (float, normalized to 0.0 to 1.0)
-    :return: (bool, image) True with new if image was generated, False with original image otherwise
+    :param image: sRGB bayeredimage to convert (16-bit, or float normalized to 0.0 to 1.0)
+    :return: (bool, image) True with new if image was generated, False with original image otherwise.
+    16-bit images are returned as normalized float
     """
 
     if not Config.args.src_srgbtolinear:
         return (False, image)
-    assert np.issubdtype(image.dtype, np.floating), f"src_ConvertSRGBToLinear: expecting image data type to be floating-point but encountered \"{image.dtype}\""
-    image = np.where(image <= 0.04045,
-        image / 12.92,
-        ((image + 0.055) / 1.055)**2.4)
-    return (True, image)
+    if image.dtype == np.uint16:
+        # sRGB -> linear is a pure function of each 16-bit value, so use a table lookup
+        return (True, getSRGBToLinearLUT()[image])
+    assert np.issubdtype(image.dtype, np.floating), f"src_ConvertSRGBToLinear: expecting image data type to be uint16 or floating-point but encountered \"{image.dtype}\""
+    return (True, convertSRGBToLinear(image))
 
 
 def src_ApplyInverseWbMultipliers(bayerImageFloat: np.ndarray) -> np.ndarray:
@@ -1351,8 +1927,8 @@ def src_ApplyInverseWbMultipliers(bayerImageFloat: np.ndarray) -> np.ndarray:
 
     assert np.issubdtype(bayerImageFloat.dtype, np.floating), f"src_ApplyInverseWbMultipliers() expecting image data type to be floating-point but encountered \"{bayerImageFloat.dtype}\""
     assert bayerImageFloat.ndim==2, f"src_ApplyInverseWbMultipliers() expecting 2D bayer array but encountered {bayerImageFloat.shape}"
-    bayerImageFloat[0::2, 0::2] = bayerImageFloat[0::2, 0::2] * (1/wbMultipliers.red)
-    bayerImageFloat[1::2, 1::2] = bayerImageFloat[1::2, 1::2] * (1/wbMultipliers.blue)
+    bayerImageFloat[0::2, 0::2] *= (1/wbMultipliers.red)
+    bayerImageFloat[1::2, 1::2] *= (1/wbMultipliers.blue)
     return (True, bayerImageFloat)
 
 
@@ -1384,6 +1960,64 @@ def src_AddBlackLevelBias(image: np.ndarray) -> np.ndarray:
     return (True, image)
 
 
+def getBayerPhaseLUTs() -> np.ndarray:
+
+    """
+    Builds the lookup tables that take a 16-bit bayered value straight to its final 14-bit raw value
+    (sRGB to linear, inverse WB multipliers, scaling to 14-bit and black level bias). Each of those
+    steps is a pure function of a pixel's 16-bit value and its position in the RGGB pattern, so there's
+    a table for each of the four positions. The tables are generated by running the same src_* operations
+    on a bayered image holding every 16-bit value at all four positions, so a lookup produces the identical
+    value to performing the operations on the pixel itself. The tables depend on the configuration of
+    the conversion (WB multipliers, black level, sRGB to linear), so they're built for each conversion
+    rather than cached; building them takes only a couple of ms
+
+    :return: 2x2x65536 LUTs, indexed by [row parity][column parity][16-bit value]
+    """
+
+    lutOps = [
+        src_ConvertSRGBToLinear, # looks up 16-bit values directly into normalized linear float
+        src_Convert16BitToNormalizedFloat, # only necessary when sRGB to linear is disabled
+        src_ApplyInverseWbMultipliers,
+        src_ScaleNormalizedFloatTo14Bit,
+        src_AddBlackLevelBias,
+    ]
+
+    # 16-bit value 'v' occupies rows 2v and 2v+1 of both columns, ie a full RGGB quad for each value
+    lutImage = np.repeat(np.arange(65536, dtype=np.uint16), 4).reshape(65536*2, 2)
+    for op in lutOps:
+        (fPerformedOp, lutImage) = op(lutImage)
+    return np.ascontiguousarray(lutImage.reshape(65536, 2, 2).transpose(1, 2, 0))
+
+
+def src_PerformBayerPhaseInBands(image: np.ndarray) -> np.ndarray:
+
+    """
+    Performs the bayer phase (bayering, sRGB to linear, inverse WB multipliers, scaling to 14-bit
+    and black level bias) one band of rows at a time rather than as a series of full-image passes.
+    Each band is bayered and then taken straight to its 14-bit raw values through the LUTs from
+    getBayerPhaseLUTs(), which fold all the remaining steps into a single lookup per pixel without
+    any float intermediates. The LUTs are generated by the same src_* operations used for the full
+    image, so the output is identical
+
+    :param image: 16-bit source image (RGB or grayscale) or 16-bit bayered image
+    :return: (True, image) 14-bit bayered image with black level bias applied
+    """
+
+    luts = getBayerPhaseLUTs()
+    countRows = image.shape[0]
+    bayeredImage = np.empty(image.shape[0:2], dtype=np.uint16)
+    for startRow in range(0, countRows, BayerPhaseBandRows):
+        # each band is bayered straight into its rows of the output and then looked up in place (np.take()
+        # buffers its output), so we're not allocating a new bayered band for every band
+        bayeredBand = bayeredImage[startRow:startRow+BayerPhaseBandRows]
+        (fPerformedOp, band) = src_ConvertToBayer(image[startRow:startRow+BayerPhaseBandRows], out=bayeredBand)
+        for rowParity in (0, 1):
+            for columnParity in (0, 1):
+                np.take(luts[rowParity, columnParity], band[rowParity::2, columnParity::2], out=bayeredBand[rowParity::2, columnParity::2])
+    return (True, bayeredImage)
+
+
 def printExecutionTime(desc: str, timeElapsed: float) -> None:
 
     """
@@ -1437,6 +2071,21 @@ def performSrcImageOpList(opsList: List[Callable[[np.ndarray], np.ndarray]], ima
     return (timeElapsed, image)
 
 
+def prefetchImage(filename: str) -> None:
+
+    """
+    Starts loading an image file on a worker thread, so that it can be loaded while we're
+    doing other work that doesn't depend on it. cv2 doesn't hold the GIL while it reads and
+    decodes the file. loadImage() picks up the prefetched image
+
+    :param filename: Filename of image to load
+    """
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    PrefetchedImages[filename] = executor.submit(cv2.imread, filename, cv2.IMREAD_UNCHANGED)
+    executor.shutdown(wait=False) # the worker thread exits once the load completes
+
+
 def loadImage(filename:str) -> np.ndarray:
 
     """
@@ -1447,9 +2096,12 @@ def loadImage(filename:str) -> np.ndarray:
     """
 
     #
-    # load image into numpy array using opencv
+    # load image into numpy array using opencv, unless it's already being loaded by prefetchImage()
     #
-    image = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
+    if (prefetchFuture := PrefetchedImages.pop(filename, None)) is not None:
+        image = prefetchFuture.result()
+    else:
+        image = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
     if image is not None:
         return image
 
@@ -1489,39 +2141,37 @@ def processSourceImageData(image: np.ndarray) -> tuple[ np.ndarray[tuple[int, in
     #
 
     #
-    # note: src_ConvertSRGBToLinear() is slow due to raised-power logic, so
-    # try to run it after bayer conversion to execute faster (less data to convert vs RGB array)
+    # note: src_ConvertSRGBToLinear() is run after bayer conversion to execute faster (less data
+    # to convert vs RGB array). along with the rest of the bayer phase it's folded into lookup
+    # tables on the 16-bit bayered values, which avoids its raised-power logic
     #
 
     sourceOps = [
 
-        # first do integer-based operations
-        src_Convert_8BitTo16Bit,
+        # first do integer-based operations. 8-bit sources are widened to 16 bits after the resize, so that
+        # an image which only needs cropping/positioning is processed at 8 bits (src_Resize() widens it
+        # itself before any interpolation)
         src_Resize,
-
-        # now do operations that require float
-        src_Convert16BitToNormalizedFloat,
-        src_ModifyHSL,
-
-        # all source operations are done. convet back to 16-bit integer
-        src_ConvertNormalizedFloatTo16Bit,
+        src_Convert_8BitTo16Bit,
     ]
+    if Config.args.src_hsl not in (None, [1.0, 1.0, 1.0]):
+        # now do operations that require float. these are skipped for an identity HSL adjustment (as
+        # createoverlay.py passes), along with the 16-bit -> float -> 16-bit round trip done for them
+        sourceOps += [
+            src_Convert16BitToNormalizedFloat,
+            src_ModifyHSL,
+
+            # all source operations are done. convet back to 16-bit integer
+            src_ConvertNormalizedFloatTo16Bit,
+        ]
 
     bayerOps = [
 
-        # we enter this phase with 16-bit data
-
-        # bayer the image
-        src_ConvertToBayer,
-
-        # now do operations on float bayered data
-        src_Convert16BitToNormalizedFloat,
-        src_ConvertSRGBToLinear,
-        src_ApplyInverseWbMultipliers,
-
-        # convert float bayered back to 16-bit but scaled to 14-bit values (in prepration for 14-bit raw encoding)
-        src_ScaleNormalizedFloatTo14Bit,
-        src_AddBlackLevelBias
+        # we enter this phase with 16-bit data. src_PerformBayerPhaseInBands() bayers the
+        # image, then does the operations on the bayered data (sRGB to linear, inverse WB,
+        # scaling to 14-bit values in prepration for 14-bit raw encoding, black level bias)
+        # as a single table lookup per pixel, a band of rows at a time
+        src_PerformBayerPhaseInBands,
     ]
 
     (totalTimeElapsed, image) = performSrcImageOpList(sourceOps, image)
@@ -1730,6 +2380,108 @@ def resolveTemplateNefSource():
     return True
 
 
+def convertInputFile() -> bool:
+
+    """
+    Converts the input file into an output NEF, using the template NEF EXIF
+    info already extracted into Config.exif
+
+    :return: False if successful, True if error
+    """
+
+    # process the source image, which results in both bayer output and the fully-processed source image (to generated embedded jpgs from)
+    (image, bayeredImage) = processSourceFile()
+    if bayeredImage is None:
+        return True
+
+    def getEncodedImageData() -> memoryview:
+        encodedImageData = encodeFuture.result()
+        if encodedImageData is not None:
+            bytesCompressed = len(encodedImageData)
+            bytesUncompressed = int(Config.exif.rawDimensions.columns * Config.exif.rawDimensions.rows * 14 / 8);
+            printI(f"NEF: {bytesCompressed:,} compressed bytes, which is {float(bytesCompressed) / bytesUncompressed * 100:.2f}% of 14-bit image size ({bytesUncompressed:,} bytes)")
+        return encodedImageData
+
+    #
+    # encode the source image using Nikon's lossless compression. the encoder doesn't hold the GIL, so it's
+    # run on a worker thread while writeOutputNEF() maps the template NEF and generates the embedded jpgs,
+    # which only need the processed source image. writeOutputNEF() waits for the encoded data once it needs it
+    #
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        encodeFuture = executor.submit(execMethodPartialAndPrintExecutionTime, partial(src_EncodeToNikonLossless, bayeredImage))
+        # write encoded raw data into NEF, including generating the embedded jpgs
+        fWriteFailed = writeOutputNEF(image, getEncodedImageData)
+    if fWriteFailed:
+        if encodeFuture.result() is not None: # encoder errors have already been reported
+            printE("Error generating/writing output NEF")
+        return True
+
+    return False
+
+
+def initBatchWorker(args: argparse.Namespace, exif: TemplateNefExif) -> None:
+
+    """
+    Initializes a --batch worker process with the config of the main process.
+    The template NEF's EXIF info is passed in so that each worker doesn't have
+    to extract it again.
+
+    :param args: Processed command line args of main process
+    :param exif: Template NEF EXIF info extracted by main process
+    """
+
+    Config.args = args
+    Config.exif = exif
+    configurePrintMethods(args.verbosity)
+    importOptionalModules()
+
+
+def convertInputFileInBatchWorker(inputFilename: str) -> bool:
+
+    """
+    Converts one file of a --batch, within a worker process
+
+    :param inputFilename: Input file to convert
+    :return: False if successful, True if error
+    """
+
+    Config.args.inputfilename = inputFilename
+    try:
+        return convertInputFile()
+    except Exception as e:
+        printE(f"Unexpected error converting \"{inputFilename}\": {e}")
+        return True
+
+
+def convertInputFilesInBatch() -> bool:
+
+    """
+    Converts every file matching the --batch wildcard pattern in <image filename>.
+    The conversions are independent of each other and CPU-bound, so they're
+    distributed across a pool of worker processes. Each worker maps the template
+    NEF copy-on-write when writing, so they all share the OS's cached copy of it.
+
+    :return: False if all files were converted successfully, True if error
+    """
+
+    inputFilenames = sorted(filename for filename in glob.glob(Config.args.inputfilename) if os.path.isfile(filename))
+    if not inputFilenames:
+        printE(f"No files match the --batch pattern \"{Config.args.inputfilename}\"")
+        return True
+
+    numWorkers = min(Config.args.batchworkers, len(inputFilenames))
+    printI(f"Batch: Converting {len(inputFilenames)} files using {numWorkers} worker process(es)")
+    with ProcessPoolExecutor(max_workers=numWorkers, initializer=initBatchWorker, initargs=(Config.args, Config.exif)) as executor:
+        results = list(executor.map(convertInputFileInBatchWorker, inputFilenames))
+
+    failedFilenames = [filename for (filename, fError) in zip(inputFilenames, results) if fError]
+    if failedFilenames:
+        printE(f"Batch: {len(failedFilenames)} of {len(inputFilenames)} files failed to convert: {', '.join(failedFilenames)}")
+        return True
+    printI(f"Batch: All {len(inputFilenames)} files converted successfully")
+    return False
+
+
 def run() -> bool:
 
     """
@@ -1742,6 +2494,9 @@ def run() -> bool:
     Config.args = processCmdLine()
     if Config.args is None:
         return True
+    configurePrintMethods(Config.args.verbosity)
+    if importOptionalModules():
+        return True
 
     printI(f"{AppName} v{AppVersion}")
     printD(f"Args: {Config.args}")
@@ -1750,29 +2505,24 @@ def run() -> bool:
     if resolveTemplateNefSource():
         return True
 
+    # start loading the source image while we process the template NEF, since the load doesn't depend on it. any
+    # prefetch left over from a previous run() that failed before loading its image is dropped, so it can't go stale
+    PrefetchedImages.clear()
+    if (not Config.args.batch) and (splitPathIntoParts(Config.args.inputfilename)[2].upper() != ".NPY"):
+        prefetchImage(Config.args.inputfilename)
+
     # process the template NEF and make sure it's the type we're expecting
-    Config.exif  = extractExifFromNEF(Config.args.templatenef)
+    nefStat = os.stat(Config.args.templatenef)
+    Config.exif = extractExifFromNEFUsingCache(os.path.abspath(Config.args.templatenef), nefStat.st_mtime_ns, nefStat.st_size)
     if Config.exif is None:
         return True
     printD(f"Template EXIF: {Config.exif}")
 
-    # process the source image, which results in both bayer output and the fully-processed source image (to generated embedded jpgs from)
-    (image, bayeredImage) = processSourceFile()
-    if bayeredImage is None:
-        return True
-
-    # encode the source image using Nikon's lossless compression
-    encodedImageData = execMethodPartialAndPrintExecutionTime(partial(src_EncodeToNikonLossless, bayeredImage))
-    if encodedImageData is None:
-        return True
-    bytesCompressed = len(encodedImageData)
-    bytesUncompressed = int(Config.exif.rawDimensions.columns * Config.exif.rawDimensions.rows * 14 / 8);
-    printI(f"NEF: {bytesCompressed:,} compressed bytes, which is {float(bytesCompressed) / bytesUncompressed * 100:.2f}% of 14-bit image size ({bytesUncompressed:,} bytes)")
-
-    # write encoded raw data into NEF, including generating the embedded jpgs
-    fWriteFailed = writeOutputNEF(image, encodedImageData)
-    if fWriteFailed:
-        printE("Error generating/writing output NEF")
+    if Config.args.batch:
+        fError = convertInputFilesInBatch()
+    else:
+        fError = convertInputFile()
+    if fError:
         return True
 
     # if running in Python debugger, break now to examine vars
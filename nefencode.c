@@ -48,7 +48,7 @@ typedef struct _NEF_HUFF_TABLE_ENTRY {
 typedef struct _NEF_ENCODE_CONTEXT {
     int         outputBufferBytesStored;
     int         countBitsValidInCurrentBitWord;
-    uint32_t    currentBitWord;
+    uint64_t    currentBitWord;     // 64 bits so that a full 32-bit word can be emitted with bits pending past it, without a loop
     uint8_t     *outputBuffer;
 } NEF_ENCODE_CONTEXT;
 
@@ -160,29 +160,18 @@ static inline const NEF_HUFF_TABLE_ENTRY *getHuffTableEntryForCountBitsNeededEnc
  * @param countBits Number of bits in 'value' to add.
  * @param value Value we're encoding
  */
-static void addBitsToOutput(NEF_ENCODE_CONTEXT *ctx, int countBits, uint32_t value) {
-
-    int countBitsLeftToAdd = countBits;
-    int countBitsAddThisIteration;
-
-    // assumed 'countBits < 32', as logic doesn't support shift operations == 32 bits, the behavior of which is undefined in 'C'
-    while (countBitsLeftToAdd > 0) {
-
-        countBitsAddThisIteration = MIN(countBitsLeftToAdd, 32 - ctx->countBitsValidInCurrentBitWord); // constrain this loop iteration to # bits left and #bits available in current bit word
-
-        ctx->currentBitWord <<= countBitsAddThisIteration; // make room for bits being inserted
-        ctx->currentBitWord |= value >> (countBitsLeftToAdd - countBitsAddThisIteration) & ((1 << countBitsAddThisIteration) - 1); // insert bits
-
-        ctx->countBitsValidInCurrentBitWord += countBitsAddThisIteration;
-
-        if (ctx->countBitsValidInCurrentBitWord == 32) {
-            *(uint32_t *)&ctx->outputBuffer[ctx->outputBufferBytesStored] = SWAP_ENDIAN_32_BITS_IF_PLATFORM_LITTLE_ENDIAN(ctx->currentBitWord);
-            ctx->outputBufferBytesStored += 4;
-            ctx->countBitsValidInCurrentBitWord = 0;
-            ctx->currentBitWord = 0x00;
-        }
-
-        countBitsLeftToAdd -= countBitsAddThisIteration;
+static inline void addBitsToOutput(NEF_ENCODE_CONTEXT *ctx, int countBits, uint32_t value) {
+
+    // assumed 'countBits < 32', as logic doesn't support shift operations == 32 bits, the behavior of which is undefined in 'C'.
+    // there are always < 32 bits pending on entry, so the pending + new bits always fit in the 64-bit word
+    ctx->currentBitWord = (ctx->currentBitWord << countBits) | (value & ((1u << countBits) - 1)); // insert bits
+    ctx->countBitsValidInCurrentBitWord += countBits;
+
+    if (ctx->countBitsValidInCurrentBitWord >= 32) {
+        // emit the oldest 32 bits, leaving any bits past them pending
+        ctx->countBitsValidInCurrentBitWord -= 32;
+        *(uint32_t *)&ctx->outputBuffer[ctx->outputBufferBytesStored] = SWAP_ENDIAN_32_BITS_IF_PLATFORM_LITTLE_ENDIAN((uint32_t)(ctx->currentBitWord >> ctx->countBitsValidInCurrentBitWord));
+        ctx->outputBufferBytesStored += 4;
     }
 }
 
@@ -312,9 +301,10 @@ t_NefEncodeError NefEncode(NEF_ENCODE_PARAMS *params) {
             else
                 prevPixelValuesThisRow[column & 1] += deltaPixelValueSigned;
 
-            // pack the huffman-encoded length and pixel delta value into our output buffer
-            addBitsToOutput(&ctx, huffTableEntry->countHuffEncodingBits, (uint32_t)huffTableEntry->huffEncodingValue);
-            addBitsToOutput(&ctx, countBitsNeededForDeltaValue, (uint32_t)encodedDeltaPixelValueWithSignBit);
+            // pack the huffman-encoded length and pixel delta value into our output buffer. they're added together
+            // as a single value since combined they're at most 22 bits (8-bit huffman code + 14-bit delta)
+            addBitsToOutput(&ctx, huffTableEntry->countHuffEncodingBits + countBitsNeededForDeltaValue,
+                ((uint32_t)huffTableEntry->huffEncodingValue << countBitsNeededForDeltaValue) | (uint32_t)encodedDeltaPixelValueWithSignBit);
 
         }
     }